@@ -0,0 +1,126 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from database import Database
+
+
+# The Database methods that AsyncDatabase offers as coroutines with the same arguments and return values
+MIRRORED = (
+    "next_reservation_id",
+    "insert_reservation",
+    "book",
+    "insert_reservations_bulk",
+    "remove_reservation",
+    "update_reservation",
+    "move_reservation",
+    "get_reservation",
+    "get_reservation_by_id",
+    "archive",
+    "next_table_nr",
+    "update_table",
+    "new_table",
+    "new_tables_bulk",
+    "remove_table",
+    "set_occupied",
+    "reseat",
+    "get_tables_by_capacity",
+    "get_tables",
+    "get_occupied",
+    "get_table_times",
+    "get_available_times",
+    "tables_left",
+    "get_free_tables",
+    "is_occupied",
+    "allocate_ids",
+    "cache_stats",
+)
+
+
+class AsyncDatabase:
+    """
+    An asyncio front for Database that never blocks the event loop.
+
+    Description:
+    Every call is run on a dedicated thread pool of `workers` threads, and the Database underneath gets a
+    connection pool of the same size so every worker keeps its own SQLite connection. At most `max_pending` calls
+    can be queued or running at once; callers beyond that wait (without blocking the loop) until a call finishes.
+    That backpressure keeps a burst of requests from piling up an unbounded queue in front of SQLite.
+
+    The coroutines mirror the Database methods listed in MIRRORED. Note that Reservation(db, ...) asks the database
+    for a new ID in its constructor, so in async code pass the ID yourself:
+    Reservation(async_db.db, amount, name, date, table_nr, await async_db.next_reservation_id()).
+
+    Example:
+    ```
+    async def main():
+        async with AsyncDatabase(workers=4) as db:
+            tables = await db.get_tables_by_capacity(4)
+            free = await db.get_free_tables(4, "2024-02-09", 19)
+
+    asyncio.run(main())
+    ```
+    """
+
+    def __init__(self, path="./db.db", workers=4, max_pending=128, **kwargs):
+        self.db = Database(path, pool_size=workers, **kwargs)
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="database")
+        self.max_pending = max_pending
+        self.pending = 0
+        self._slots = asyncio.Semaphore(max_pending)
+
+    async def run(self, function, *args, **kwargs):
+        """
+    Runs a blocking function on the database thread pool and waits for its result.
+
+    Parameters:
+    - function (callable): The function to run, normally a method of self.db.
+    - args, kwargs: Passed on to the function.
+
+    Returns:
+    - Whatever the function returns. Exceptions raised by the function are raised here.
+    """
+        async with self._slots:
+            self.pending += 1
+            try:
+                loop = asyncio.get_running_loop()
+                return await loop.run_in_executor(self.executor, partial(function, *args, **kwargs))
+            finally:
+                self.pending -= 1
+
+    async def iter_reservations(self, after_id=0, limit=None, filters=None, page_size=100):
+        # Async version of Database.iter_reservations(), every page is read on the thread pool
+        returned = 0
+        while limit is None or returned < limit:
+            size = page_size if limit is None else min(page_size, limit - returned)
+            page = await self.run(lambda: list(self.db.iter_reservations(after_id, size, filters, size)))
+            for reservation in page:
+                yield reservation
+            returned += len(page)
+            if len(page) < size:
+                return
+            after_id = page[-1][0]
+
+    async def close(self):
+        # Waits for running calls to finish, then closes the connection pool
+        await asyncio.get_running_loop().run_in_executor(None, self.executor.shutdown)
+        self.db.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        await self.close()
+
+
+def mirror(name):
+    async def method(self, *args, **kwargs):
+        return await self.run(getattr(self.db, name), *args, **kwargs)
+
+    method.__name__ = name
+    method.__qualname__ = f"AsyncDatabase.{name}"
+    method.__doc__ = f"Async version of Database.{name}(), run on the database thread pool."
+    return method
+
+
+for name in MIRRORED:
+    setattr(AsyncDatabase, name, mirror(name))
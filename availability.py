@@ -0,0 +1,138 @@
+import threading
+import time
+from queue import Empty, Queue
+
+
+# The party sizes a guest can pick, availability is always loaded for all of them at once
+PARTY_SIZES = range(1, 9)
+
+
+class AvailabilityLoader:
+    """
+    Loads the free times for (date, party size) on a background thread and caches them, for the Tk window.
+
+    Description:
+    Tk runs everything on one thread, so a database lookup in a button callback freezes the whole window. The
+    loader moves that work to its own worker thread:
+    - get() answers from the cache when it can, otherwise it queues the date for the worker and returns at once,
+    - the worker asks the booking service for the availability() of the queued dates, which holds
+      available_times() for every party size of every date, so switching the party size afterwards never waits
+      for the database,
+    - results are not handed to Tk from the worker. They go on a queue that poll() empties on the Tk thread, which
+      the window calls every few milliseconds with after().
+    Entries older than `max_age` seconds are still shown right away, but are loaded again in the background and
+    shown a second time, so bookings made from other terminals appear without the window ever waiting.
+    `db` is a server.BookingClient or LocalClient. Connecting, or opening a Database when no server runs, can wait
+    for another terminal's write lock. Pass a `factory` instead of a `db` and the worker connects itself, and
+    closes the connection again in close(), so the Tk thread never touches the database at all.
+
+    Example:
+    ```
+    loader = AvailabilityLoader(factory=open_booking)
+    loader.prefetch(calendar_days())
+    loader.get("2024-02-09", 4, lambda day, amount, times: print(times))
+    while loader.poll() == 0:
+        time.sleep(0.01)
+    loader.close()
+    ```
+    """
+
+    def __init__(self, db=None, max_age=15.0, factory=None) -> None:
+        self.db = db
+        self.factory = factory
+        self.max_age = max_age
+        self.cache = {}
+        self._requests = Queue()
+        self._results = Queue()
+        self._lock = threading.Lock()
+        self._worker = threading.Thread(target=self.run, name="availability", daemon=True)
+        self._worker.start()
+
+    def cached(self, day, amount):
+        # (loaded_at, times) or None
+        with self._lock:
+            return self.cache.get((day, amount))
+
+    def get(self, day, amount, callback):
+        """
+    Asks for the free times of a date for a party, without blocking.
+
+    Parameters:
+    - day (str): The date, for example "2024-02-09".
+    - amount (int): The size of the party.
+    - callback (callable): Called from poll() as callback(day, amount, times), where times maps every hour to
+      True if it is occupied, like OccupancyMatrix.available_times().
+
+    Returns:
+    - bool: True if cached times were delivered (through poll()), False if the caller has to wait for the load.
+    """
+        entry = self.cached(day, amount)
+        if entry is not None:
+            self._results.put((callback, day, amount, entry[1]))
+            if time.monotonic() - entry[0] < self.max_age:
+                return True
+        self._requests.put(((day,), amount, callback, time.monotonic()))
+        return entry is not None
+
+    def prefetch(self, days):
+        # Loads every party size for all `days` in one go, without calling anybody back
+        self._requests.put((tuple(days), None, None, time.monotonic()))
+
+    def invalidate(self, day=None):
+        # Forgets the cached times of one date, or of every date, for example after a booking from this window
+        with self._lock:
+            if day is None:
+                self.cache.clear()
+            else:
+                for size in PARTY_SIZES:
+                    self.cache.pop((day, size), None)
+
+    def run(self):
+        try:
+            self.serve()
+        finally:
+            # A connection the worker opened itself is closed on the same thread
+            if self.factory is not None and self.db is not None:
+                self.db.close()
+
+    def serve(self):
+        while True:
+            request = self._requests.get()
+            if request is None:
+                return
+            days, amount, callback, asked = request
+            # Requests that were queued twice, or were answered by a prefetch in the meantime, are not loaded again
+            missing = [day for day in days if (self.cached(day, amount or PARTY_SIZES[0]) or (0.0,))[0] < asked]
+            try:
+                if self.db is None:
+                    self.db = self.factory()
+                if missing:
+                    self.load(missing)
+            except Exception as error:
+                print(f"Error: could not load free times: {error}")
+                continue
+            entry = self.cached(days[0], amount) if callback is not None else None
+            if entry is not None:
+                self._results.put((callback, days[0], amount, entry[1]))
+
+    def load(self, days):
+        # Stamped before reading, so a request made while this load runs is loaded again
+        loaded = time.monotonic()
+        times = {key: (loaded, times) for key, times in self.db.availability(days, PARTY_SIZES).items()}
+        with self._lock:
+            self.cache.update(times)
+
+    def poll(self) -> int:
+        # Runs the callbacks of everything loaded so far, call it from the Tk thread. Returns how many ran.
+        delivered = 0
+        while True:
+            try:
+                callback, day, amount, times = self._results.get_nowait()
+            except Empty:
+                return delivered
+            callback(day, amount, times)
+            delivered += 1
+
+    def close(self):
+        self._requests.put(None)
+        self._worker.join()
@@ -0,0 +1,142 @@
+import threading
+import time
+from concurrent.futures import Future
+from queue import Empty, Queue
+
+
+# The Database methods that WriteBatcher offers, they return a Future of the method's usual return value
+BATCHED = (
+    "insert_reservation",
+    "book",
+    "update_reservation",
+    "move_reservation",
+    "remove_reservation",
+    "set_occupied",
+    "reseat",
+    "update_table",
+    "new_table",
+    "remove_table",
+)
+
+
+class WriteBatcher:
+    """
+    Collects writes from many threads and commits them together, one transaction for a whole batch.
+
+    Description:
+    Every write method of Database commits on its own, and every commit waits for the disk. Under a burst of
+    bookings most of the time goes to those waits. The batcher has one writer thread that takes the queued writes,
+    up to `max_batch` of them or whatever arrives within `max_delay` seconds of the first one, and runs them all
+    inside a single Database.transaction():
+    - every write still runs in its own nested transaction, which is a SAVEPOINT, so a write that raises is rolled
+      back on its own and does not take the rest of the batch with it,
+    - each caller's Future gets that write's own return value or exception,
+    - but only after the batch has been committed, so a booking that is reported as saved is exactly as durable
+      as one that committed by itself. If the commit fails, every Future in the batch gets the error.
+    A lone write waits at most `max_delay` longer than before; under load one commit is shared by many writes.
+
+    Example:
+    ```
+    db = Database()
+    with WriteBatcher(db) as batcher:
+        futures = [batcher.book(reservation) for reservation in reservations]
+        booked = [future.result() for future in futures]
+    ```
+    """
+
+    def __init__(self, db, max_batch=64, max_delay=0.002) -> None:
+        self.db = db
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.batches = 0
+        self.writes = 0
+        self._queue = Queue()
+        self._writer = threading.Thread(target=self.run, name="write-batcher", daemon=True)
+        self._writer.start()
+
+    def submit(self, function, *args, **kwargs) -> Future:
+        """
+    Queues a write and returns at once.
+
+    Parameters:
+    - function (callable): The write to run on the writer thread, normally a method of the Database.
+    - args, kwargs: Passed on to the function.
+
+    Returns:
+    - Future: Resolves to the function's return value, or raises its exception, once the batch is committed.
+    """
+        future = Future()
+        self._queue.put((function, args, kwargs, future))
+        return future
+
+    def collect(self, first) -> list:
+        # The first write plus whatever else comes in before the batch is full or the delay is over
+        batch = [first]
+        deadline = time.perf_counter() + self.max_delay
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            try:
+                write = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except Empty:
+                break
+            if write is None:
+                # close() was called, put the marker back for run()
+                self._queue.put(None)
+                break
+            batch.append(write)
+        return batch
+
+    def run(self):
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+            self.commit(self.collect(first))
+
+    def commit(self, batch):
+        outcomes = []
+        try:
+            with self.db.transaction():
+                for function, args, kwargs, future in batch:
+                    try:
+                        with self.db.transaction():
+                            outcomes.append((future, True, function(*args, **kwargs)))
+                    except Exception as error:
+                        outcomes.append((future, False, error))
+        except Exception as error:
+            for _, _, _, future in batch:
+                future.set_exception(error)
+            return
+
+        self.batches += 1
+        self.writes += len(batch)
+        for future, ok, value in outcomes:
+            if ok:
+                future.set_result(value)
+            else:
+                future.set_exception(value)
+
+    def close(self):
+        # Commits everything that is already queued, then stops the writer thread
+        self._queue.put(None)
+        self._writer.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def batched(name):
+    def method(self, *args, **kwargs):
+        return self.submit(getattr(self.db, name), *args, **kwargs)
+
+    method.__name__ = name
+    method.__qualname__ = f"WriteBatcher.{name}"
+    method.__doc__ = f"Queues Database.{name}() and returns a Future of its result."
+    return method
+
+
+for name in BATCHED:
+    setattr(WriteBatcher, name, batched(name))
@@ -0,0 +1,514 @@
+import argparse
+import datetime
+import json
+import multiprocessing
+import os
+import platform
+import random
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from database import Database
+from batching import WriteBatcher
+from reservations import Reservation
+from server import BookingClient, BookingServer
+from timetable import HOURS, week, calendar_days
+
+
+CAPACITIES = (2, 4, 6, 8)
+
+# The programs people start, and how long importing each may take before `startup` reports it as too slow
+STARTUP_BUDGET_MS = {"guest": 10, "staff": 10, "tk_shell_guests": 150}
+
+
+def percentile(samples, fraction):
+    # Nearest-rank percentile of an already sorted list
+    index = max(0, min(len(samples) - 1, round(fraction * len(samples)) - 1))
+    return samples[index]
+
+
+def summarize(samples):
+    """
+    Turns a list of latencies in seconds into a result dict.
+
+    Returns:
+    - dict: count, p50_ms, p99_ms, mean_ms, max_ms and ops_per_second.
+    """
+    samples = sorted(samples)
+    total = sum(samples)
+    return {
+        "count": len(samples),
+        "p50_ms": percentile(samples, 0.50) * 1000,
+        "p99_ms": percentile(samples, 0.99) * 1000,
+        "mean_ms": total / len(samples) * 1000,
+        "max_ms": samples[-1] * 1000,
+        "ops_per_second": len(samples) / total if total > 0 else 0.0,
+    }
+
+
+def timed(operation, arguments):
+    # Calls operation once per item in arguments and returns the latency of every call
+    samples = []
+    for argument in arguments:
+        started = time.perf_counter()
+        operation(*argument)
+        samples.append(time.perf_counter() - started)
+    return samples
+
+
+def build_restaurant(path, table_count, reservation_count, fill, rng, profile="wal"):
+    """
+    Creates a synthetic restaurant in a new database file.
+
+    Parameters:
+    - path (str): Where to create the database.
+    - table_count (int): How many tables to add, with capacities cycling through CAPACITIES.
+    - reservation_count (int): How many old reservations to add to the history.
+    - fill (float): The share of this week's slots that are booked, between 0 and 1.
+    - rng (random.Random): The random generator, so runs with the same seed get the same data.
+    - profile (str, optional): The Database performance profile to create the file with. Defaults to "wal".
+
+    Returns:
+    - Database: The database, ready for benchmarking.
+
+    Description:
+    The history rows are written straight into 'reservation' because their slots have been freed long ago. The
+    booked part of the week goes through insert_reservations_bulk() like a real import would.
+    """
+    db = Database(path, profile=profile)
+    db.new_tables_bulk([CAPACITIES[i % len(CAPACITIES)] for i in range(table_count)])
+    history = calendar_days(datetime.date.today() - datetime.timedelta(days=365), 365)
+
+    for start in range(0, reservation_count, 100_000):
+        count = min(100_000, reservation_count - start)
+        ids = db.allocate_ids("reservation", count)
+        rows = [(id, f"Guest {id}", rng.randint(1, 8), f"{rng.choice(history)}_{rng.choice(HOURS)}",
+                 rng.randint(1, table_count)) for id in ids]
+        with db.transaction() as conn:
+            conn.executemany("INSERT INTO reservation (id, name, amt_guests, date, table_nr) VALUES (?, ?, ?, ?, ?)",
+                             rows)
+
+    slots = [(table_nr, day, hour) for table_nr in range(1, table_count + 1) for day in week() for hour in HOURS]
+    booked = rng.sample(slots, int(len(slots) * fill))
+    db.insert_reservations_bulk([("Guest", 2, f"{day}_{hour}", table_nr) for table_nr, day, hour in booked])
+    return db
+
+
+def free_slots(db, count, rng):
+    with db as conn:
+        booked = set(conn.execute("SELECT table_nr, day, hour FROM table_slots"))
+        table_nrs = [table_nr for table_nr, in conn.execute("SELECT table_nr FROM tables")]
+
+    days = week()
+    found = []
+    while len(found) < count:
+        slot = (rng.choice(table_nrs), rng.choice(days), rng.choice(HOURS))
+        if slot not in booked:
+            booked.add(slot)
+            found.append(slot)
+    return found
+
+
+def run_hotpaths(table_count, reservation_count, iterations, fill, seed, cache_size):
+    """
+    Times the booking hot paths of Database against one synthetic restaurant.
+
+    Returns:
+    - dict: The setup time and a summarize() result per operation.
+    """
+    rng = random.Random(seed)
+    with tempfile.TemporaryDirectory() as directory:
+        started = time.perf_counter()
+        db = build_restaurant(os.path.join(directory, "bench.db"), table_count, reservation_count, fill, rng)
+        db.table_cache.maxsize = cache_size
+        setup_seconds = time.perf_counter() - started
+
+        results = {}
+        results["next_reservation_id"] = summarize(timed(db.next_reservation_id, [()] * iterations))
+
+        ids = db.allocate_ids("reservation", iterations)
+        bookings = [(Reservation(db, 2, "Bench", f"{day}_{hour}", table_nr, id),)
+                    for id, (table_nr, day, hour) in zip(ids, free_slots(db, iterations, rng))]
+        results["insert_reservation"] = summarize(timed(db.insert_reservation, bookings))
+
+        # Every call toggles a slot, so run each reservation twice to leave the week as it was
+        toggles = rng.sample(bookings, min(iterations, len(bookings)))
+        results["set_occupied"] = summarize(timed(db.set_occupied, toggles + toggles))
+
+        capacities = [(rng.choice(CAPACITIES),) for _ in range(iterations)]
+        results["get_tables_by_capacity"] = summarize(timed(db.get_tables_by_capacity, capacities))
+
+        removals = [(reservation.id,) for reservation, in bookings]
+        results["remove_reservation"] = summarize(timed(db.remove_reservation, removals))
+
+        db.close()
+
+    return {"tables": table_count, "reservations": reservation_count, "setup_seconds": setup_seconds,
+            "operations": results}
+
+
+def concurrent_reader(path, profile, seconds, seed, results):
+    # One guest terminal: checks availability as fast as it can, without the table cache
+    rng = random.Random(seed)
+    db = Database(path, profile=profile, cache_size=0)
+    days = week()
+    samples = []
+    errors = 0
+    stop = time.perf_counter() + seconds
+    while time.perf_counter() < stop:
+        started = time.perf_counter()
+        try:
+            db.get_free_tables(rng.choice(CAPACITIES), rng.choice(days), rng.choice(HOURS))
+        except sqlite3.OperationalError:
+            errors += 1
+            continue
+        samples.append(time.perf_counter() - started)
+    db.close()
+    results.put(("read", samples, errors))
+
+
+def concurrent_writer(path, profile, seconds, seed, batch, results):
+    # One staff terminal: keeps moving bookings around, `batch` slot changes per transaction
+    rng = random.Random(seed)
+    db = Database(path, profile=profile, cache_size=0)
+    table_count = len(db.get_tables())
+    days = week()
+    samples = []
+    errors = 0
+    stop = time.perf_counter() + seconds
+    while time.perf_counter() < stop:
+        changes = [Reservation(db, 2, "Bench", f"{rng.choice(days)}_{rng.choice(HOURS)}",
+                               rng.randint(1, table_count), 0) for _ in range(batch)]
+        started = time.perf_counter()
+        try:
+            with db.transaction():
+                for reservation in changes:
+                    db.set_occupied(reservation)
+        except sqlite3.OperationalError:
+            errors += 1
+            continue
+        samples.append(time.perf_counter() - started)
+    db.close()
+    results.put(("write", samples, errors))
+
+
+def run_concurrency(profile, table_count, reservation_count, readers, writers, seconds, batch, seed):
+    """
+    Runs reader and writer processes against one database file at the same time.
+
+    Returns:
+    - dict: Reads and writes per second, their latency summaries and how many calls failed with a locked database.
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "bench.db")
+        build_restaurant(path, table_count, reservation_count, 0.3, random.Random(seed), profile).close()
+
+        results = multiprocessing.Queue()
+        processes = [multiprocessing.Process(target=concurrent_reader, args=(path, profile, seconds, seed + i, results))
+                     for i in range(readers)]
+        processes += [multiprocessing.Process(target=concurrent_writer,
+                                              args=(path, profile, seconds, seed + readers + i, batch, results))
+                      for i in range(writers)]
+        for process in processes:
+            process.start()
+        collected = [results.get() for _ in processes]
+        for process in processes:
+            process.join()
+
+    report = {"profile": profile, "readers": readers, "writers": writers, "seconds": seconds}
+    for kind in ("read", "write"):
+        samples = [sample for result in collected if result[0] == kind for sample in result[1]]
+        report[f"{kind}_errors"] = sum(result[2] for result in collected if result[0] == kind)
+        report[f"{kind}s_per_second"] = len(samples) / seconds
+        report[kind] = summarize(samples) if samples else None
+    return report
+
+
+def server_client(address, seconds, seed, write_share, results):
+    # One terminal on the booking server: mostly availability checks, now and then a booking
+    rng = random.Random(seed)
+    days = week()
+    samples = []
+    with BookingClient(address) as client:
+        stop = time.perf_counter() + seconds
+        while time.perf_counter() < stop:
+            started = time.perf_counter()
+            if rng.random() < write_share:
+                client.book_party(rng.choice(CAPACITIES), "Bench", rng.choice(days), rng.choice(HOURS))
+            else:
+                client.get_free_tables(rng.choice(CAPACITIES), rng.choice(days), rng.choice(HOURS))
+            samples.append(time.perf_counter() - started)
+    results.put(samples)
+
+
+def run_server(workers, table_count, reservation_count, clients, seconds, write_share, seed):
+    """
+    Runs client processes against a BookingServer with `workers` reader processes.
+
+    Returns:
+    - dict: Requests per second over all clients and their latency summary.
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "bench.db")
+        build_restaurant(path, table_count, reservation_count, 0.3, random.Random(seed)).close()
+        server = BookingServer(path, ("127.0.0.1", 0), workers).start()
+        try:
+            results = multiprocessing.Queue()
+            processes = [multiprocessing.Process(target=server_client,
+                                                 args=(server.address, seconds, seed + i, write_share, results))
+                         for i in range(clients)]
+            for process in processes:
+                process.start()
+            collected = [results.get() for _ in processes]
+            for process in processes:
+                process.join()
+        finally:
+            server.close()
+
+    samples = [sample for result in collected for sample in result]
+    return {"workers": workers, "clients": clients, "seconds": seconds,
+            "requests_per_second": len(samples) / seconds, "latency": summarize(samples)}
+
+
+def print_server(results):
+    print(f"\n{'readers':<10}{'requests/s':>12}{'speedup':>10}{'p50 ms':>10}{'p99 ms':>10}")
+    for run in results:
+        speedup = run["requests_per_second"] / results[0]["requests_per_second"]
+        print(f"{run['workers']:<10}{run['requests_per_second']:>12.0f}{speedup:>10.2f}"
+              f"{run['latency']['p50_ms']:>10.3f}{run['latency']['p99_ms']:>10.3f}")
+
+
+def run_batching(profile, table_count, threads, writes, max_batch, seed):
+    """
+    Books from many threads at once, every booking committed on its own versus through a WriteBatcher.
+
+    Returns:
+    - dict: Bookings per second and the latency summary for "single" and "batched", and the batches committed.
+    """
+    report = {"profile": profile, "threads": threads, "writes": threads * writes}
+    for mode in ("single", "batched"):
+        with tempfile.TemporaryDirectory() as directory:
+            rng = random.Random(seed)
+            path = os.path.join(directory, "bench.db")
+            build_restaurant(path, table_count, 0, 0.0, rng, profile).close()
+            db = Database(path, pool_size=threads + 1, profile=profile)
+            slots = free_slots(db, threads * writes, rng)
+            ids = db.allocate_ids("reservation", len(slots))
+            bookings = [Reservation(db, 2, "Bench", f"{day}_{hour}", table_nr, id)
+                        for id, (table_nr, day, hour) in zip(ids, slots)]
+            batcher = WriteBatcher(db, max_batch) if mode == "batched" else None
+            samples = []
+
+            def book(part):
+                for reservation in part:
+                    started = time.perf_counter()
+                    if batcher is None:
+                        db.book(reservation)
+                    else:
+                        batcher.book(reservation).result()
+                    samples.append(time.perf_counter() - started)
+
+            workers = [threading.Thread(target=book, args=(bookings[i::threads],)) for i in range(threads)]
+            started = time.perf_counter()
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+            seconds = time.perf_counter() - started
+            if batcher is not None:
+                batcher.close()
+                report["batches"] = batcher.batches
+            db.close()
+        report[mode] = summarize(samples) | {"ops_per_second": len(samples) / seconds}
+    return report
+
+
+def print_batching(results):
+    print(f"\n{'profile':<10}{'threads':>8}{'single/s':>10}{'batched/s':>11}{'speedup':>9}{'per commit':>12}")
+    for run in results:
+        single, batched = run["single"]["ops_per_second"], run["batched"]["ops_per_second"]
+        print(f"{run['profile']:<10}{run['threads']:>8}{single:>10.0f}{batched:>11.0f}{batched / single:>9.2f}"
+              f"{run['writes'] / run['batches']:>12.1f}")
+
+
+def import_times(module, directory):
+    """
+    Imports a module in a fresh interpreter with `python -X importtime` and reads the report.
+
+    Returns:
+    - dict: "total_ms" for the whole import, "imports" with the self and cumulative milliseconds of every module
+      it loaded, or "error" with the last line of the traceback if the import failed.
+
+    Description:
+    The report lists every import of the interpreter, children before their parent and indented one step deeper.
+    Only the lines after the previous top level import belong to `module`, the rest is Python's own startup.
+    """
+    # Run from an empty directory, so a program that still opened ./db.db on import would not touch the real one
+    process = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"], cwd=directory,
+                             capture_output=True, text=True,
+                             env={**os.environ, "PYTHONPATH": os.path.dirname(os.path.abspath(__file__))})
+    imports = {}
+    for line in process.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        own, cumulative, name = line[len("import time:"):].split("|")
+        if name[:2] != "  ":
+            if name.strip() != module:
+                imports = {}
+                continue
+        imports[name.strip()] = {"self_ms": int(own) / 1000, "cumulative_ms": int(cumulative) / 1000}
+    if process.returncode != 0:
+        return {"error": process.stderr.strip().splitlines()[-1]}
+    return {"total_ms": imports[module]["cumulative_ms"], "imports": imports}
+
+
+def run_startup(modules, runs, top):
+    """
+    Measures how long importing each program takes, the best of `runs` fresh interpreters.
+
+    Returns:
+    - dict: For every module its total_ms, its budget_ms from STARTUP_BUDGET_MS and the `top` imports that
+      took longest on their own.
+    """
+    report = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for module in modules:
+            samples = [import_times(module, directory) for _ in range(runs)]
+            failed = [sample for sample in samples if "error" in sample]
+            if failed:
+                report[module] = {"error": failed[0]["error"]}
+                continue
+            best = min(samples, key=lambda sample: sample["total_ms"])
+            slowest = sorted(best["imports"].items(), key=lambda item: item[1]["self_ms"], reverse=True)[:top]
+            report[module] = {"total_ms": best["total_ms"], "budget_ms": STARTUP_BUDGET_MS.get(module),
+                              "slowest": dict(slowest)}
+    return report
+
+
+def print_startup(results):
+    print(f"\n{'program':<18}{'import ms':>10}{'budget ms':>10}  slowest imports")
+    for module, result in results.items():
+        if "error" in result:
+            print(f"{module:<18}{'-':>10}{'-':>10}  {result['error']}")
+            continue
+        budget = result["budget_ms"]
+        over = " OVER BUDGET" if budget is not None and result["total_ms"] > budget else ""
+        slowest = ", ".join(f"{name} {times['self_ms']:.1f}" for name, times in result["slowest"].items())
+        print(f"{module:<18}{result['total_ms']:>10.1f}{budget if budget is not None else '-':>10}  {slowest}{over}")
+
+
+def print_concurrency(results):
+    print(f"\n{'profile':<10}{'reads/s':>10}{'read p99 ms':>13}{'writes/s':>10}{'write p99 ms':>14}{'errors':>8}")
+    for run in results:
+        read_p99 = run["read"]["p99_ms"] if run["read"] else float("nan")
+        write_p99 = run["write"]["p99_ms"] if run["write"] else float("nan")
+        print(f"{run['profile']:<10}{run['reads_per_second']:>10.0f}{read_p99:>13.3f}"
+              f"{run['writes_per_second']:>10.0f}{write_p99:>14.3f}{run['read_errors'] + run['write_errors']:>8}")
+
+
+def print_results(results):
+    for run in results:
+        print(f"\n{run['tables']} tables, {run['reservations']} reservations (setup {run['setup_seconds']:.2f} s)")
+        print(f"{'operation':<26}{'p50 ms':>10}{'p99 ms':>10}{'ops/s':>12}")
+        for name, result in run["operations"].items():
+            print(f"{name:<26}{result['p50_ms']:>10.3f}{result['p99_ms']:>10.3f}{result['ops_per_second']:>12.0f}")
+
+
+def save_results(path, command, arguments, results):
+    report = {
+        "command": command,
+        "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "machine": platform.machine(),
+        "arguments": arguments,
+        "results": results,
+    }
+    with open(path, "w") as file:
+        json.dump(report, file, indent=2)
+    print(f"\nSaved results to {path}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks for the restaurant booking database.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    hotpaths = commands.add_parser("hotpaths", help="time the booking hot paths as the restaurant grows")
+    hotpaths.add_argument("--tables", type=int, nargs="+", default=[10, 100, 1000, 10000])
+    hotpaths.add_argument("--reservations", type=int, default=10000,
+                          help="old reservations in the history table")
+    hotpaths.add_argument("--iterations", type=int, default=200, help="calls per operation")
+    hotpaths.add_argument("--fill", type=float, default=0.5, help="share of this week's slots already booked")
+    hotpaths.add_argument("--cache-size", type=int, default=256, help="table cache size, 0 turns it off")
+    hotpaths.add_argument("--seed", type=int, default=1)
+    hotpaths.add_argument("--output", default="benchmark_results.json")
+
+    concurrency = commands.add_parser("concurrency", help="compare profiles with readers and writers at once")
+    concurrency.add_argument("--profiles", nargs="+", default=["default", "wal"])
+    concurrency.add_argument("--tables", type=int, default=100)
+    concurrency.add_argument("--reservations", type=int, default=10000)
+    concurrency.add_argument("--readers", type=int, default=4)
+    concurrency.add_argument("--writers", type=int, default=1)
+    concurrency.add_argument("--seconds", type=float, default=3.0)
+    concurrency.add_argument("--batch", type=int, default=20, help="slot changes per write transaction")
+    concurrency.add_argument("--seed", type=int, default=1)
+    concurrency.add_argument("--output", default="benchmark_results.json")
+
+    serving = commands.add_parser("server", help="load the booking server with more and more reader processes")
+    serving.add_argument("--workers", type=int, nargs="+",
+                         default=[2 ** i for i in range((os.cpu_count() or 1).bit_length())],
+                         help="reader process counts to compare, defaults to 1, 2, 4 ... up to the core count")
+    serving.add_argument("--clients", type=int, default=16, help="client processes sending requests")
+    serving.add_argument("--tables", type=int, default=100)
+    serving.add_argument("--reservations", type=int, default=10000)
+    serving.add_argument("--seconds", type=float, default=5.0)
+    serving.add_argument("--write-share", type=float, default=0.05, help="share of requests that book a party")
+    serving.add_argument("--seed", type=int, default=1)
+    serving.add_argument("--output", default="benchmark_results.json")
+
+    batching = commands.add_parser("batching", help="compare bookings committed one by one and in batches")
+    batching.add_argument("--profiles", nargs="+", default=["default", "wal"])
+    batching.add_argument("--tables", type=int, default=100)
+    batching.add_argument("--threads", type=int, default=16, help="threads booking at the same time")
+    batching.add_argument("--writes", type=int, default=50, help="bookings per thread")
+    batching.add_argument("--max-batch", type=int, default=64)
+    batching.add_argument("--seed", type=int, default=1)
+    batching.add_argument("--output", default="benchmark_results.json")
+
+    startup = commands.add_parser("startup", help="report how long each program takes to import")
+    startup.add_argument("--modules", nargs="+", default=[*STARTUP_BUDGET_MS, "server"])
+    startup.add_argument("--runs", type=int, default=5, help="fresh interpreters per module, the fastest counts")
+    startup.add_argument("--top", type=int, default=5, help="slowest imports to list per module")
+    startup.add_argument("--output", default="benchmark_results.json")
+
+    arguments = parser.parse_args()
+    if arguments.command == "hotpaths":
+        results = [run_hotpaths(table_count, arguments.reservations, arguments.iterations, arguments.fill,
+                                arguments.seed, arguments.cache_size) for table_count in arguments.tables]
+        print_results(results)
+    elif arguments.command == "concurrency":
+        results = [run_concurrency(profile, arguments.tables, arguments.reservations, arguments.readers,
+                                   arguments.writers, arguments.seconds, arguments.batch, arguments.seed)
+                   for profile in arguments.profiles]
+        print_concurrency(results)
+    elif arguments.command == "server":
+        results = [run_server(workers, arguments.tables, arguments.reservations, arguments.clients,
+                              arguments.seconds, arguments.write_share, arguments.seed)
+                   for workers in arguments.workers]
+        print_server(results)
+    elif arguments.command == "batching":
+        results = [run_batching(profile, arguments.tables, arguments.threads, arguments.writes, arguments.max_batch,
+                                arguments.seed) for profile in arguments.profiles]
+        print_batching(results)
+    elif arguments.command == "startup":
+        results = run_startup(arguments.modules, arguments.runs, arguments.top)
+        print_startup(results)
+
+    save_results(arguments.output, arguments.command, vars(arguments), results)
+
+
+if __name__ == "__main__":
+    main()
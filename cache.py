@@ -0,0 +1,70 @@
+import threading
+from collections import OrderedDict
+
+
+class LRUCache:
+    """
+    A bounded, thread safe key/value cache that throws out the least recently used entry when it is full.
+
+    Description:
+    get() counts a hit or a miss, so the counters show how well the cache works. Entries are removed with
+    invalidate() when the data behind them changes, or all at once with clear(). Both count up `generation`: a
+    value that was read before an invalidation may already be out of date, so put() with the generation from
+    before the read skips storing it.
+
+    Example:
+    ```
+    cache = LRUCache(2)
+    cache.put("a", 1)
+    cache.get("a")        # 1, a hit
+    cache.get("b")        # None, a miss
+    print(cache.stats())
+    ```
+    """
+
+    def __init__(self, maxsize=256):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.generation = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+            return default
+
+    def put(self, key, value, generation=None):
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, *keys):
+        with self._lock:
+            self.generation += 1
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self.generation += 1
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {"size": len(self._entries), "maxsize": self.maxsize, "hits": self.hits, "misses": self.misses,
+                "evictions": self.evictions, "hit_rate": self.hits / lookups if lookups else 0.0}
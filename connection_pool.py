@@ -0,0 +1,198 @@
+import random
+import sqlite3
+import threading
+import time
+from queue import LifoQueue, Empty
+
+
+def retry_locked(operation, retries=5, backoff=0.01):
+    """
+    Calls operation() and retries it while SQLite reports that the database is locked or busy.
+
+    Parameters:
+    - operation (callable): The function to call, without arguments.
+    - retries (int, optional): How many extra attempts to make. Defaults to 5.
+    - backoff (float, optional): The wait in seconds before the first retry. It doubles for every retry and gets a
+      little random jitter so that waiting programs do not all retry at the same moment. Defaults to 0.01.
+
+    Returns:
+    - Whatever operation() returns.
+
+    Raises:
+    - sqlite3.OperationalError: Raised if the database is still locked after the last retry, or for any other
+      operational error straight away.
+    """
+    for attempt in range(retries + 1):
+        try:
+            return operation()
+        except sqlite3.OperationalError as error:
+            message = str(error).lower()
+            if attempt == retries or not ("locked" in message or "busy" in message):
+                raise
+            time.sleep(backoff * 2 ** attempt * random.uniform(0.5, 1.5))
+
+
+class ConnectionPool:
+    """
+    A small pool of reusable SQLite connections shared by every method of a Database.
+
+    Description:
+    Opening a new sqlite3 connection for every database call is slow, so the pool keeps up to `size` open
+    connections and hands them out again. A thread that is already holding a connection gets the very same
+    connection back when it asks again (nested calls such as book -> transaction -> get_tables),
+    and the connection is only returned to the pool once the outermost caller is done with it. Idle
+    connections are health checked before they are handed out again and replaced if they are broken. Every new
+    connection gets the given PRAGMA settings (see database.PROFILES) and has the `attached` database files
+    attached under their schema names. New connections are created with `factory` (a sqlite3.Connection subclass)
+    and handed to `on_connect`, which is how tracing.Tracer hooks into them.
+
+    Example:
+    ```
+    pool = ConnectionPool("./db.db", size=4)
+    conn = pool.acquire()
+    conn.execute("SELECT 1")
+    pool.release()
+    pool.close()
+    ```
+    """
+
+    def __init__(self, path, size=5, timeout=5.0, health_check_interval=30.0, pragmas=None, retries=0, backoff=0.01,
+                 attached=None, factory=sqlite3.Connection, on_connect=None):
+        self.path = path
+        self.size = size
+        self.timeout = timeout
+        self.health_check_interval = health_check_interval
+        self.pragmas = pragmas or {}
+        self.retries = retries
+        self.backoff = backoff
+        self.attached = attached or {}
+        self.factory = factory
+        self.on_connect = on_connect
+        self.opened = 0
+
+        self._idle = LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=self.timeout, check_same_thread=False, factory=self.factory)
+        try:
+            for pragma, value in self.pragmas.items():
+                # Switching journal mode needs a moment without other writers, so it may have to wait its turn
+                retry_locked(lambda: conn.execute(f"PRAGMA {pragma} = {value}").fetchall(),
+                             self.retries, self.backoff)
+            for schema, path in self.attached.items():
+                conn.execute(f"ATTACH DATABASE ? AS {schema}", (path,))
+            if self.on_connect is not None:
+                self.on_connect(conn)
+        except BaseException:
+            conn.close()
+            raise
+        with self._lock:
+            self.opened += 1
+        return conn
+
+    def _healthy(self, conn):
+        try:
+            conn.execute("SELECT 1").fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def _discard(self, conn):
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+
+    def _checkout(self):
+        try:
+            conn, last_used = self._idle.get_nowait()
+        except Empty:
+            return self._connect()
+
+        if time.monotonic() - last_used >= self.health_check_interval and not self._healthy(conn):
+            self._discard(conn)
+            return self._connect()
+        return conn
+
+    def acquire(self):
+        """
+    Hands out a connection for the calling thread.
+
+    Returns:
+    - sqlite3.Connection: The connection the calling thread should use.
+
+    Raises:
+    - sqlite3.ProgrammingError: Raised if the pool has been closed.
+    - sqlite3.OperationalError: Raised if no connection became free within `timeout` seconds.
+
+    Description:
+    If the calling thread already holds a connection, that connection is returned again and a nesting counter
+    is increased. Otherwise an idle connection is taken from the pool, or a new one is opened if the pool has
+    not reached its size yet. Every call to acquire() must be matched by a call to release().
+    """
+        local = self._local
+        if getattr(local, "depth", 0) > 0:
+            local.depth += 1
+            return local.conn
+
+        if self._closed:
+            raise sqlite3.ProgrammingError("Cannot operate on a closed connection pool.")
+
+        if not self._slots.acquire(timeout=self.timeout):
+            raise sqlite3.OperationalError("Timed out waiting for a free pooled connection.")
+
+        try:
+            conn = self._checkout()
+        except BaseException:
+            self._slots.release()
+            raise
+
+        local.conn = conn
+        local.depth = 1
+        return conn
+
+    def release(self):
+        """
+    Gives the calling thread's connection back to the pool.
+
+    Description:
+    Only the outermost release() of a thread actually returns the connection. Any transaction that was left
+    open by the caller is rolled back first, so the next user always starts from a clean connection.
+    """
+        local = self._local
+        local.depth -= 1
+        if local.depth > 0:
+            return
+
+        conn = local.conn
+        local.conn = None
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+            if self._closed:
+                self._discard(conn)
+            else:
+                self._idle.put((conn, time.monotonic()))
+        except sqlite3.Error:
+            self._discard(conn)
+        finally:
+            self._slots.release()
+
+    def close(self):
+        """
+    Closes every idle connection and stops the pool from handing out new ones.
+
+    Description:
+    Connections that are currently in use are closed as soon as their thread releases them.
+    """
+        self._closed = True
+        while True:
+            try:
+                conn, _ = self._idle.get_nowait()
+            except Empty:
+                break
+            self._discard(conn)
@@ -1,31 +1,724 @@
 import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from connection_pool import ConnectionPool, retry_locked
+from cache import LRUCache
 from table import Table
 from reservations import Reservation
-from json import dumps as json_dumps
+from timetable import gen_timetable, HOURS, WEEKDAYS, HORIZON_DAYS, today, calendar_days, next_date
+
+
+def throughput(rows, started):
+    # Report for the bulk methods, started is a time.perf_counter() value
+    seconds = time.perf_counter() - started
+    return {"rows": rows, "seconds": seconds, "rows_per_second": rows / seconds if seconds > 0 else 0.0}
+
+
+# The tables the program needs, created by Database.migrate(). Database(**kwargs) can add more.
+SCHEMAS = {
+    "reservation": """ CREATE TABLE IF NOT EXISTS reservation
+            (id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT,
+            amt_guests INTEGER,
+            date TEXT,
+            table_nr INTEGER)""",
+    "tables": """ CREATE TABLE IF NOT EXISTS tables
+            (table_nr INTEGER PRIMARY KEY AUTOINCREMENT,
+            capacity INTEGER)""",
+    "table_slots": """ CREATE TABLE IF NOT EXISTS table_slots
+            (table_nr INTEGER NOT NULL,
+            day TEXT NOT NULL,
+            hour INTEGER NOT NULL,
+            reservation_id INTEGER,
+            PRIMARY KEY (table_nr, day, hour)) WITHOUT ROWID""",
+    "slot_summary": """ CREATE TABLE IF NOT EXISTS slot_summary
+            (day TEXT NOT NULL,
+            hour INTEGER NOT NULL,
+            capacity INTEGER NOT NULL,
+            booked INTEGER NOT NULL,
+            PRIMARY KEY (day, hour, capacity)) WITHOUT ROWID""",
+}
+
+# reservation.id, tables.table_nr and (table_slots.table_nr, day, hour) are already primary keys
+INDEXES = {
+    "reservation_date": "CREATE INDEX IF NOT EXISTS reservation_date ON reservation (date)",
+    "reservation_table_nr": "CREATE INDEX IF NOT EXISTS reservation_table_nr ON reservation (table_nr)",
+    "tables_capacity": "CREATE INDEX IF NOT EXISTS tables_capacity ON tables (capacity)",
+    "table_slots_day_hour": "CREATE INDEX IF NOT EXISTS table_slots_day_hour ON table_slots (day, hour)",
+    "table_slots_reservation": "CREATE INDEX IF NOT EXISTS table_slots_reservation ON table_slots (reservation_id)",
+}
+
+# Keep 'slot_summary' (booked tables per day, hour and capacity) in step with 'table_slots' and 'tables'. Every
+# write that books, frees, moves or resizes goes through these in its own transaction, whichever method made it.
+TRIGGERS = {
+    "slot_summary_book": """CREATE TRIGGER IF NOT EXISTS slot_summary_book AFTER INSERT ON table_slots BEGIN
+            INSERT INTO slot_summary (day, hour, capacity, booked)
+            SELECT NEW.day, NEW.hour, capacity, 1 FROM tables WHERE table_nr = NEW.table_nr
+            ON CONFLICT (day, hour, capacity) DO UPDATE SET booked = booked + 1;
+        END""",
+    "slot_summary_free": """CREATE TRIGGER IF NOT EXISTS slot_summary_free AFTER DELETE ON table_slots BEGIN
+            UPDATE slot_summary SET booked = booked - 1 WHERE day = OLD.day AND hour = OLD.hour
+            AND capacity = (SELECT capacity FROM tables WHERE table_nr = OLD.table_nr);
+        END""",
+    "slot_summary_move": """CREATE TRIGGER IF NOT EXISTS slot_summary_move AFTER UPDATE OF table_nr, day, hour
+        ON table_slots BEGIN
+            UPDATE slot_summary SET booked = booked - 1 WHERE day = OLD.day AND hour = OLD.hour
+            AND capacity = (SELECT capacity FROM tables WHERE table_nr = OLD.table_nr);
+            INSERT INTO slot_summary (day, hour, capacity, booked)
+            SELECT NEW.day, NEW.hour, capacity, 1 FROM tables WHERE table_nr = NEW.table_nr
+            ON CONFLICT (day, hour, capacity) DO UPDATE SET booked = booked + 1;
+        END""",
+    "slot_summary_resize": """CREATE TRIGGER IF NOT EXISTS slot_summary_resize AFTER UPDATE OF capacity ON tables
+        WHEN OLD.capacity IS NOT NEW.capacity BEGIN
+            UPDATE slot_summary SET booked = booked - 1 WHERE capacity = OLD.capacity
+            AND (day, hour) IN (SELECT day, hour FROM table_slots WHERE table_nr = OLD.table_nr);
+            INSERT INTO slot_summary (day, hour, capacity, booked)
+            SELECT day, hour, NEW.capacity, 1 FROM table_slots WHERE table_nr = NEW.table_nr
+            ON CONFLICT (day, hour, capacity) DO UPDATE SET booked = booked + 1;
+        END""",
+    # remove_table() deletes the table before its slots, so its booked slots are taken off here
+    "slot_summary_remove": """CREATE TRIGGER IF NOT EXISTS slot_summary_remove AFTER DELETE ON tables BEGIN
+            UPDATE slot_summary SET booked = booked - 1 WHERE capacity = OLD.capacity
+            AND (day, hour) IN (SELECT day, hour FROM table_slots WHERE table_nr = OLD.table_nr);
+        END""",
+}
+
+# Performance profiles for Database(profile=...). "wal" lets guest terminals keep reading while staff write:
+# readers never wait for the writer, commits only sync at checkpoints, and a busy database is retried with backoff.
+PROFILES = {
+    "default": {
+        "pragmas": {},
+        "retries": 0,
+        "backoff": 0.0,
+    },
+    "wal": {
+        "pragmas": {
+            "journal_mode": "WAL",
+            "synchronous": "NORMAL",
+            "cache_size": -16000,
+            "mmap_size": 67108864,
+            "busy_timeout": 5000,
+            "temp_store": "MEMORY",
+        },
+        "retries": 5,
+        "backoff": 0.01,
+    },
+}
+
+# One table per month of finished reservations, see Database.archive(). IDs keep their values, so no AUTOINCREMENT.
+ARCHIVE_SCHEMA = """ CREATE TABLE IF NOT EXISTS {name}
+            (id INTEGER PRIMARY KEY,
+            name TEXT,
+            amt_guests INTEGER,
+            date TEXT,
+            table_nr INTEGER)"""
+
+# Every step brings the database up one version (PRAGMA user_version). Only ever add steps at the end.
+MIGRATIONS = (
+    "migrate_occupancy",
+    "migrate_ids",
+    "create_indexes",
+    "migrate_dates",
+    "create_summary",
+)
 
 
 class Database:
-    def __init__(self, path="./db.db", **kwargs):
+    def __init__(self, path="./db.db", pool_size=5, cache_size=256, profile="wal", horizon=HORIZON_DAYS,
+                 archive_path=None, instrument=False, trace=False, slow_ms=10.0, **kwargs):
         self.path = path
-        self.schemas = {}
+        self.horizon = horizon
+        self.compacted_on = None
+        # Archive partitions live in the main file unless a separate archive file is given
+        self.archive_schema = "archive" if archive_path else "main"
+        self.archiver = None
+        self.archiver_stop = threading.Event()
+        self.profile = PROFILES[profile] if isinstance(profile, str) else profile
+        # Database(trace=True) records every SQL statement, see tracing.Tracer. Like instrumentation below it is
+        # only imported when asked for, which keeps `import database` fast for the terminals.
+        self.tracer = None
+        factory = sqlite3.Connection
+        if trace:
+            from tracing import Tracer, TracingConnection
+            self.tracer = Tracer(slow_ms)
+            factory = TracingConnection
+        self.pool = ConnectionPool(path, pool_size, pragmas=self.profile["pragmas"],
+                                   retries=self.profile["retries"], backoff=self.profile["backoff"],
+                                   attached={"archive": archive_path} if archive_path else None,
+                                   factory=factory, on_connect=self.tracer.attach if trace else None)
+        # Database(instrument=True) times every method, see instrumentation.Metrics
+        self.metrics = None
+        if instrument:
+            from instrumentation import Metrics
+            self.metrics = Metrics()
+            self.metrics.instrument(self)
+        self.table_cache = LRUCache(cache_size)
+        self.data_versions = {}
+        self.schemas = dict(SCHEMAS)
         for schema_name, schema in kwargs.items():
             self.schemas[schema_name] = schema
+        self.indexes = dict(INDEXES)
+        self.migrate()
+        self.compact()
 
     def __enter__(self):
-        self.conn = sqlite3.connect(self.path)
-        return self.conn
+        return self.pool.acquire()
 
     def __exit__(self, *args):
-        self.conn.close()
-    
+        self.pool.release()
+
+    def close(self):
+        """
+    Closes every pooled connection of the database.
+
+    Description:
+    Call this when the program is done with the database, for example when a terminal exits. A background
+    archiver started with start_archiver() and a metrics dump are stopped first. Methods called after close() raise
+    sqlite3.ProgrammingError.
+
+    Example:
+    ```
+    db_connection = Database()
+    db_connection.close()
+    ```
+    """
+        self.archiver_stop.set()
+        if self.archiver is not None and self.archiver is not threading.current_thread():
+            self.archiver.join()
+        if self.metrics is not None:
+            self.metrics.stop_dump()
+        self.pool.close()
+
+    def cached(self, key, load):
+        """
+    Returns a cached value from the table cache, or loads and caches it on a miss.
+
+    Parameters:
+    - self: The instance of the class representing the database connection.
+    - key (tuple): The cache key, for example ("tables", "3").
+    - load (function): Called without arguments to read the value from the database on a miss.
+
+    Returns:
+    - The cached or freshly loaded value.
+
+    Description:
+    Changes made through this Database object invalidate exactly the entries they affect (see invalidate_table()).
+    Changes committed by other programs are noticed through SQLite's 'PRAGMA data_version', which changes
+    whenever another connection commits; the whole cache is then dropped before the lookup. Inside a write
+    transaction the value is loaded but not cached, because it may hold changes that are rolled back later.
+    Another thread can commit and invalidate while the value is being loaded, and the connection that committed
+    never sees its own commit in data_version. So the value is only stored if nothing was invalidated meanwhile.
+    """
+        with self as db:
+            if db.in_transaction:
+                return load()
+            version = db.execute("PRAGMA data_version").fetchone()[0]
+            if self.data_versions.get(id(db)) != version:
+                self.data_versions[id(db)] = version
+                self.table_cache.clear()
+
+            value = self.table_cache.get(key, self.table_cache)
+            if value is self.table_cache:
+                generation = self.table_cache.generation
+                value = load()
+                self.table_cache.put(key, value, generation)
+
+        return value
+
+    def invalidate_table(self, table_nr, *capacities):
+        """
+    Drops every cached row and timetable that a change to one table can affect.
+
+    Parameters:
+    - self: The instance of the class representing the database connection.
+    - table_nr (int or str): The table that changed.
+    - capacities (int): The table's capacities before and after the change, whose capacity lookups are dropped too.
+    """
+        self.table_cache.invalidate(("tables", "*"), ("tables", str(table_nr)), ("occupied", str(table_nr)),
+                                    *[("capacity", str(capacity)) for capacity in capacities])
+
+    def cache_stats(self):
+        """
+    Returns the hit and miss counters of the table cache.
+
+    Returns:
+    - dict: The keys "size", "maxsize", "hits", "misses", "evictions" and "hit_rate".
+
+    Example:
+    ```
+    db_connection = Database()
+    db_connection.get_tables()
+    db_connection.get_tables()
+    print(db_connection.cache_stats()["hits"])
+    ```
+    """
+        return self.table_cache.stats()
+
+    @contextmanager
+    def transaction(self):
+        """
+    Runs a block of database work as one write transaction.
+
+    Returns:
+    - sqlite3.Connection: The pooled connection to run the statements on (through the `with` statement).
+
+    Raises:
+    - Any exceptions raised inside the block, after the transaction has been rolled back.
+
+    Description:
+    The transaction is started with BEGIN IMMEDIATE, which takes SQLite's write lock right away, so two programs
+    can never both read a value and then write based on it. The transaction is committed when the block ends and
+    rolled back if the block raises. If the write lock stays busy longer than the busy timeout, starting the
+    transaction is retried with the backoff of the database's profile. If the calling thread is already inside a
+    transaction, the block joins it under a SAVEPOINT: when the block raises only its own changes are rolled back,
+    and the outermost transaction still decides when to commit (see batching.WriteBatcher).
+
+    Example:
+    ```
+    db_connection = Database()
+    with db_connection.transaction() as db:
+        db.execute("UPDATE tables SET capacity=? WHERE table_nr=?", (4, 1))
+    ```
+    """
+        with self as db:
+            if db.in_transaction:
+                db.execute("SAVEPOINT nested")
+                try:
+                    yield db
+                except BaseException:
+                    db.execute("ROLLBACK TO nested")
+                    db.execute("RELEASE nested")
+                    # Entries dropped or changed inside the block may have to come back
+                    self.table_cache.clear()
+                    raise
+                db.execute("RELEASE nested")
+                return
+
+            retry_locked(lambda: db.execute("BEGIN IMMEDIATE"), self.profile["retries"], self.profile["backoff"])
+            try:
+                yield db
+            except BaseException:
+                db.rollback()
+                self.table_cache.clear()
+                raise
+            db.commit()
+
+    def allocate_ids(self, table, count=1):
+        """
+    Reserves a block of new, unique IDs for the 'reservation' or 'tables' table.
+
+    Parameters:
+    - self: The instance of the class representing the database connection.
+    - table (str): Either "reservation" or "tables".
+    - count (int, optional): How many IDs to reserve. Defaults to 1.
+
+    Returns:
+    - range: The reserved IDs, in increasing order.
+
+    Raises:
+    - ValueError: Raised if the table has no ID sequence or count is less than 1.
+    - Any exceptions that may occur during database interaction.
+
+    Description:
+    Both tables use an INTEGER PRIMARY KEY AUTOINCREMENT column, so SQLite keeps the highest ID ever handed out in
+    'sqlite_sequence'. This method moves that counter forward by `count` inside an IMMEDIATE transaction, so the cost
+    does not depend on how many rows the table holds and two programs can never get the same ID. An ID that is
+    reserved but never used is simply skipped.
+
+    Example:
+    ```
+    db_connection = Database()
+    ids = db_connection.allocate_ids("reservation", 100)
+    print(ids[0], ids[-1])
+    ```
+    """
+        if table not in ("reservation", "tables") or count < 1:
+            raise ValueError(f"Cannot allocate {count} ids for {table}.")
+
+        with self.transaction() as db:
+            cursor = db.cursor()
+            cursor.execute("INSERT INTO sqlite_sequence (name, seq) SELECT ?, 0 \
+                            WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name=?)", (table, table))
+            cursor.execute("UPDATE sqlite_sequence SET seq = seq + ? WHERE name=?", (count, table))
+            last_id = cursor.execute("SELECT seq FROM sqlite_sequence WHERE name=?", (table,)).fetchone()[0]
+
+        return range(last_id - count + 1, last_id + 1)
+
+    def migrate(self):
+        """
+    Brings the database schema up to the newest version.
+
+    Returns:
+    - int: The schema version of the database after migrating.
+
+    Raises:
+    - Any exceptions that may occur during database interaction, after every change has been rolled back.
+
+    Description:
+    The schema version is stored in SQLite's 'PRAGMA user_version'. Every step in MIGRATIONS that the database has
+    not had yet is run in order, and the version is raised after each step. Everything runs in one IMMEDIATE
+    transaction, so if two programs start at the same time one of them waits and then finds nothing left to do.
+    Finally every schema in self.schemas, including the ones given to Database(**kwargs), is created if it is
+    missing. Database() calls this method on startup.
+
+    Example:
+    ```
+    db_connection = Database()
+    print("Schema version:", db_connection.migrate())
+    ```
+    """
+        with self.transaction() as db:
+            cursor = db.cursor()
+            version = cursor.execute("PRAGMA user_version").fetchone()[0]
+            for number, migration in enumerate(MIGRATIONS[version:], version + 1):
+                getattr(self, migration)()
+                cursor.execute(f"PRAGMA user_version = {number}")
+
+            for schema in self.schemas.values():
+                cursor.execute(schema)
+
+        return max(version, len(MIGRATIONS))
+
+    def create_indexes(self):
+        """
+    Creates every index in self.indexes that does not exist yet.
+
+    Raises:
+    - Any exceptions that may occur during database interaction.
+
+    Description:
+    The indexes cover every lookup the program does: reservations by date and table number, tables by capacity
+    and booked slots by (day, hour) and by reservation. IDs and table numbers are primary keys and need no index of
+    their own.
+
+    Example:
+    ```
+    db_connection = Database()
+    db_connection.create_indexes()
+    ```
+    """
+        with self.transaction() as db:
+            cursor = db.cursor()
+            for index in self.indexes.values():
+                cursor.execute(index)
+
+    def migrate_ids(self):
+        """
+    Makes 'reservation.id' and 'tables.table_nr' INTEGER PRIMARY KEY AUTOINCREMENT columns.
+
+    Raises:
+    - sqlite3.IntegrityError: Raised if an old table holds the same ID twice.
+    - Any exceptions that may occur during database interaction.
+
+    Description:
+    Older databases were created with plain INTEGER columns and no primary key, which made every ID lookup a full
+    table scan. This method creates the tables from self.schemas if they are missing and rebuilds old ones with the
+    new key, keeping every row. Tables that already have the new key are left alone, so running it again does
+    nothing. It is step 2 of MIGRATIONS.
+
+    Example:
+    ```
+    db_connection = Database()
+    db_connection.migrate_ids()
+    ```
+    """
+        keys = {"reservation": "id, name, amt_guests, date, table_nr", "tables": "table_nr, capacity"}
+        with self.transaction() as db:
+            cursor = db.cursor()
+            for table, columns in keys.items():
+                sql = cursor.execute("SELECT sql FROM sqlite_master WHERE type='table' AND name=?",
+                                     (table,)).fetchone()
+                if sql is not None and "AUTOINCREMENT" in sql[0].upper():
+                    continue
+
+                if sql is not None:
+                    cursor.execute(f"ALTER TABLE {table} RENAME TO old_{table}")
+                cursor.execute(self.schemas[table])
+                if sql is not None:
+                    cursor.execute(f"INSERT INTO {table} ({columns}) SELECT {columns} FROM old_{table}")
+                    cursor.execute(f"DROP TABLE old_{table}")
+
+    def migrate_dates(self):
+        """
+    Changes the weekday names in 'table_slots' and 'reservation' into real dates.
+
+    Raises:
+    - Any exceptions that may occur during database interaction.
+
+    Description:
+    Slots and reservations used to be stored by weekday name ("Monday_19"), so a booking for next Monday collided
+    with this Monday and old bookings never went away. Every weekday name is replaced by the next date with that
+    weekday, counted from the day of the migration ("2024-02-05_19"), which is what the old program meant by it.
+    Rows that already hold a date are left alone. It is step 4 of MIGRATIONS.
+
+    Example:
+    ```
+    db_connection = Database()
+    db_connection.migrate_dates()
+    ```
+    """
+        with self.transaction() as db:
+            cursor = db.cursor()
+            for day in WEEKDAYS:
+                date = next_date(day)
+                cursor.execute("UPDATE table_slots SET day=? WHERE day=?", (date, day))
+                cursor.execute("UPDATE reservation SET date=? || substr(date, ?) WHERE substr(date, 1, ?)=?",
+                               (date, len(day) + 1, len(day) + 1, f"{day}_"))
+        self.table_cache.clear()
+
+    def create_summary(self):
+        """
+    Creates the 'slot_summary' table and its triggers, and fills it from the booked slots.
+
+    Raises:
+    - Any exceptions that may occur during database interaction.
+
+    Description:
+    'slot_summary' holds how many tables of every capacity are booked at every (day, hour), so tables_left() can
+    tell how many tables are still free for a party without looking at a single table. The triggers in TRIGGERS
+    keep it up to date inside the same transaction as every change to 'table_slots' or 'tables'. The counts are
+    rebuilt from scratch, so running it again repairs a summary that went out of step. It is step 5 of MIGRATIONS.
+
+    Example:
+    ```
+    db_connection = Database()
+    db_connection.create_summary()
+    ```
+    """
+        with self.transaction() as db:
+            cursor = db.cursor()
+            cursor.execute(self.schemas["slot_summary"])
+            for trigger in TRIGGERS.values():
+                cursor.execute(trigger)
+            cursor.execute("DELETE FROM slot_summary")
+            cursor.execute("""INSERT INTO slot_summary (day, hour, capacity, booked)
+                              SELECT s.day, s.hour, t.capacity, count(*) FROM table_slots s
+                              JOIN tables t ON t.table_nr = s.table_nr GROUP BY s.day, s.hour, t.capacity""")
+
+    def compact(self):
+        """
+    Frees the slots of every day that has passed.
+
+    Returns:
+    - int: The number of slot rows that were removed.
+
+    Raises:
+    - Any exceptions that may occur during database interaction.
+
+    Description:
+    Only today and the days ahead can be booked, so the rows of past days in 'table_slots' are dead weight for
+    every availability lookup. They are deleted through the (day, hour) index; the reservations themselves stay
+    as history. Database() compacts on startup and book() does it again when the date has changed since, so a
+    terminal that stays open overnight keeps its working set small as well.
+
+    Example:
+    ```
+    db_connection = Database()
+    print(db_connection.compact(), "old slots removed")
+    ```
+    """
+        with self.transaction() as db:
+            removed = db.execute("DELETE FROM table_slots WHERE day < ?", (today(),)).rowcount
+            db.execute("DELETE FROM slot_summary WHERE day < ?", (today(),))
+        self.compacted_on = today()
+        if removed:
+            self.table_cache.clear()
+        return removed
+
+    def archive(self, before=None):
+        """
+    Moves finished reservations out of the 'reservation' table into monthly archive tables.
+
+    Parameters:
+    - self: The instance of the class representing the database connection.
+    - before (str, optional): Reservations dated before this ISO date are moved. Defaults to today, and later
+      dates are not accepted, so only finished reservations are ever moved.
+
+    Returns:
+    - dict: "rows" moved, "seconds", "rows_per_second" and the "partitions" that received rows.
+
+    Raises:
+    - Any exceptions that may occur during database interaction.
+
+    Description:
+    Every month gets its own table, for example 'reservation_archive_2024_02', in the main database file or in the
+    file given as Database(archive_path=...). Each month is moved in its own short transaction, so guests and staff
+    only wait for one month at a time. The rows are copied before they are deleted and copying skips IDs that are
+    already archived, so an interrupted run is finished by the next one. IDs are never handed out again (see
+    allocate_ids()), so an archived ID stays unique. Use find_reservations() to search the archive.
+
+    Example:
+    ```
+    db_connection = Database()
+    report = db_connection.archive()
+    print(f"Archived {report['rows']} reservations into {report['partitions']}")
+    ```
+    """
+        started = time.perf_counter()
+        before = min(before or today(), today())
+        with self as db:
+            cursor = db.execute("SELECT DISTINCT substr(date, 1, 7) FROM reservation \
+                                 WHERE date < ? AND date GLOB '[0-9][0-9][0-9][0-9]-*'", (before,))
+            months = [month for month, in cursor]
+
+        moved = 0
+        partitions = []
+        for month in months:
+            name = f"reservation_archive_{month.replace('-', '_')}"
+            # "YYYY-MM-" up to "YYYY-MM." covers every date of the month and can use the date index
+            bounds = (f"{month}-", f"{month}.", before)
+            with self.transaction() as db:
+                cursor = db.cursor()
+                cursor.execute(ARCHIVE_SCHEMA.format(name=f"{self.archive_schema}.{name}"))
+                cursor.execute(f"INSERT OR IGNORE INTO {self.archive_schema}.{name} SELECT * FROM reservation \
+                                WHERE date >= ? AND date < ? AND date < ?", bounds)
+                moved += cursor.execute("DELETE FROM reservation WHERE date >= ? AND date < ? AND date < ?",
+                                        bounds).rowcount
+            partitions.append(name)
+
+        return {**throughput(moved, started), "partitions": partitions}
+
+    def start_archiver(self, interval=3600.0):
+        """
+    Runs archive() on a background thread every `interval` seconds until close() is called.
+
+    Parameters:
+    - self: The instance of the class representing the database connection.
+    - interval (float, optional): Seconds between runs. Defaults to one hour.
+
+    Example:
+    ```
+    db_connection = Database()
+    db_connection.start_archiver()
+    ```
+    """
+        def run():
+            while not self.archiver_stop.is_set():
+                try:
+                    self.archive()
+                except sqlite3.Error as e:
+                    print(e)
+                self.archiver_stop.wait(interval)
+
+        if self.archiver is None:
+            self.archiver = threading.Thread(target=run, name="archiver", daemon=True)
+            self.archiver.start()
+
+    def partitions(self, date_from=None, date_to=None):
+        # The archive tables, oldest month first, that can hold reservations between the two ISO dates
+        with self as db:
+            names = [name for name, in db.execute(
+                f"SELECT name FROM {self.archive_schema}.sqlite_master WHERE type='table' \
+                  AND name LIKE 'reservation_archive_%' ORDER BY name")]
+        first = f"reservation_archive_{date_from[:7].replace('-', '_')}" if date_from else ""
+        last = f"reservation_archive_{date_to[:7].replace('-', '_')}" if date_to else "~"
+        return [name for name in names if first <= name <= last]
+
+    def find_reservations(self, filters=None, date_from=None, date_to=None, include_archive=True):
+        """
+    Searches the reservations, including the archived ones, in date order.
+
+    Parameters:
+    - self: The instance of the class representing the database connection.
+    - filters (dict, optional): Column values the reservations must match, for example {"name": "Anna"}. Allowed
+      columns are id, name, amt_guests, date and table_nr.
+    - date_from (str, optional): The first ISO date to include. Defaults to no lower limit.
+    - date_to (str, optional): The last ISO date to include. Defaults to no upper limit.
+    - include_archive (bool, optional): Also search the archive tables. Defaults to True.
+
+    Returns:
+    - generator of tuples: Reservation rows (id, name, amt_guests, date, table_nr).
+
+    Raises:
+    - ValueError: Raised if a filter names an unknown column.
+    - Any exceptions that may occur during database interaction.
+
+    Description:
+    Only the monthly archive tables that overlap the date range are read, one month at a time and oldest first,
+    followed by the 'reservation' table. A search for last March therefore reads one archive table, however long
+    the history is.
+
+    Example:
+    ```
+    db_connection = Database()
+    for reservation in db_connection.find_reservations({"name": "Anna"}, date_from="2024-03-01"):
+        print(reservation)
+    ```
+    """
+        filters = filters or {}
+        for column in filters:
+            if column not in ("id", "name", "amt_guests", "date", "table_nr"):
+                raise ValueError(f"Cannot filter reservations on {column}.")
+        conditions = "".join(f" AND {column}=?" for column in filters)
+        if date_from:
+            conditions += " AND date >= ?"
+        if date_to:
+            # Every "YYYY-MM-DD_HH" of the last day sorts below "YYYY-MM-DD`"
+            conditions += " AND date < ? || '`'"
+        values = (*filters.values(), *[date for date in (date_from, date_to) if date])
+
+        tables = [f"{self.archive_schema}.{name}" for name in self.partitions(date_from, date_to)] \
+            if include_archive else []
+        for table in [*tables, "reservation"]:
+            with self as db:
+                page = db.execute(f"SELECT * FROM {table} WHERE 1{conditions} ORDER BY date, id", values).fetchall()
+            yield from page
+
+    def bookable(self, day):
+        # True if `day` is an ISO date from today up to the booking horizon
+        days = calendar_days(count=self.horizon)
+        return days[0] <= day <= days[-1] and len(day) == len(days[0])
+
+    def migrate_occupancy(self):
+        """
+    Creates the 'table_slots' table and moves the old JSON occupancy of every table into it.
+
+    Raises:
+    - Any exceptions that may occur during database interaction.
+
+    Description:
+    Occupancy used to be stored as one JSON string per table in the 'occupied' column of 'tables'. It is now stored
+    as one row per booked slot in 'table_slots' (table_nr, day, hour, reservation_id), so that availability can be
+    checked and changed with a single indexed statement. A slot without a row is free. This method creates the
+    table if it is missing, copies every booked slot out of the JSON column (linking it to the
+    matching reservation when there is one) and then drops the 'occupied' column. Running it again does nothing.
+    It is step 1 of MIGRATIONS.
+
+    Example:
+    ```
+    db_connection = Database()
+    db_connection.migrate_occupancy()
+    ```
+    """
+        with self.transaction() as db:
+            cursor = db.cursor()
+            cursor.execute(self.schemas["table_slots"])
+
+            columns = [column[1] for column in cursor.execute("PRAGMA table_info(tables)")]
+            if "occupied" in columns:
+                from json import loads as json_loads
+                for table_nr, occupied in cursor.execute("SELECT table_nr, occupied FROM tables").fetchall():
+                    if not occupied:
+                        continue
+                    for day, times in json_loads(occupied).items():
+                        for hour, is_occupied in times.items():
+                            if not is_occupied:
+                                continue
+                            reservation = cursor.execute("SELECT id FROM reservation WHERE table_nr=? AND date=?",
+                                                         (table_nr, f"{day}_{hour}")).fetchone()
+                            cursor.execute("INSERT OR IGNORE INTO table_slots (table_nr, day, hour, reservation_id) \
+                                            VALUES (?, ?, ?, ?)",
+                                           (table_nr, day, int(hour), reservation[0] if reservation else None))
+                cursor.execute("ALTER TABLE tables DROP COLUMN occupied")
+
     def next_reservation_id(self):
         """
     Generate the next unique ID for a new reservation based on existing entries in the database.
 
-    This method queries the database to determine the next available reservation ID. It fetches all existing 
-    reservations from the 'reservation' table, calculates the maximum ID, and returns the next available ID 
-    by incrementing the maximum ID by one. If no reservations exist in the database, it returns 1 as the 
-    starting ID.
+    This method reserves the next available reservation ID with allocate_ids(). The 'reservation' table keeps
+    the highest ID ever handed out in 'sqlite_sequence', so the lookup costs the same no matter how many
+    reservations exist. If no reservations exist in the database, it returns 1 as the starting ID.
 
     Parameters:
     - self: The instance of the class representing the database connection.
@@ -48,20 +741,10 @@ class Database:
     print("Next available reservation ID:", next_id)
     ```
 
-    Note: This method assumes that reservation IDs are integers and are stored in the first column of the 
-    'reservation' table in the database.
+    Note: Every call reserves a new ID, even if the reservation is never saved. Use allocate_ids() to reserve
+    many IDs at once.
     """
-        with self as db:
-            cursor = db.cursor()
-            cursor.execute("SELECT * FROM reservation")
-            reservations = cursor.fetchall()
-
-            if len(reservations) == 0:
-                new_id = 1
-                return new_id
-
-            new_id = max([int(data[0]) for data in reservations]) + 1
-            return new_id
+        return self.allocate_ids("reservation")[0]
 
     def insert_reservation(self, reservation: Reservation):
         """
@@ -72,17 +755,16 @@ class Database:
     - reservation (Reservation): An instance of the Reservation class representing the reservation to be inserted.
 
     Returns:
-    - None: Returns None if an exception occurs during the database interaction.
+    - bool: True if the reservation was saved, False if its table was already booked at that time.
+    - None: Returns None if the reservation holds invalid values or an exception occurs during the database interaction.
 
     Raises:
     - sqlite3.ProgrammingError: Raised if there's an issue with the SQL execution.
 
     Description:
-    This method attempts to insert reservation data into the 'reservation' table of the connected database. The provided
-    reservation object is used to populate the corresponding columns (id, name, amt_guests, date, table_nr). If an 
-    exception, specifically sqlite3.ProgrammingError, occurs during the SQL execution, it is caught, printed, and the 
-    function returns None. Otherwise, the changes are committed to the database, and the occupancy status of the 
-    associated table is updated accordingly.
+    This method checks that the reservation holds positive values and then saves it with book(), which inserts the
+    reservation row and marks the table's time slot as occupied in one transaction. If the values are invalid an
+    error message is printed and the function returns None.
 
     Example:
     ```
@@ -91,20 +773,163 @@ class Database:
     db_connection.insert_reservation(new_reservation)
     ```
     """
-        with self as db:
-            cursor = db.cursor()
-            if reservation.id > 0 and reservation.user_amount > 0 and reservation.table_id > 0:
-                try:
-                    cursor.execute("INSERT INTO reservation (id, name, amt_guests, date, table_nr) \
-                                    VALUES (?, ?, ?, ?, ?)", reservation.to_db_format())
-                except sqlite3.ProgrammingError as p:
-                    print(p)
+        if reservation.id > 0 and reservation.user_amount > 0 and reservation.table_id > 0:
+            return self.book(reservation)
+
+        print("None digit value was entered.")
+
+    def book(self, reservation: Reservation, joined=()):
+        """
+    Books a table by saving a reservation and claiming its time slot in one atomic transaction.
+
+    Parameters:
+    - self: The instance of the class representing the database connection.
+    - reservation (Reservation): The reservation to save. Its user_date must be in the format "YYYY-MM-DD_Hour".
+    - joined (iterable of int, optional): Neighbouring tables that are pushed together with the reservation's own
+      table for a big party. Their slots are claimed by the same reservation. Defaults to none.
+
+    Returns:
+    - bool: True if the booking was made, False if the slot was already taken (a booking conflict).
+    - None: Returns None if the table does not exist, the date is in the past or beyond the booking horizon, the
+      hour is not one of the opening hours in HOURS, or an exception occurs during the database interaction.
+
+    Raises:
+    - sqlite3.ProgrammingError: Raised if there's an issue with the SQL execution.
+
+    Description:
+    The booking runs inside a BEGIN IMMEDIATE transaction. The slot is claimed first by inserting its row into
+    'table_slots'. The (table_nr, day, hour) primary key makes that insert a compare-and-set: if another guest
+    terminal or staff member has booked the same slot, even at the very same moment, the insert fails, nothing is
+    written and False is returned. Only when the slot was claimed is the reservation row inserted, and both changes
+    are committed together. This way two programs can never book the same slot and no update gets lost. With joined
+    tables all slots are claimed or none: they are checked while the write lock is held and only then inserted.
+
+    Example:
+    ```
+    db_connection = YourDatabaseConnection()
+    reservation = Reservation(db_connection, 4, "John", "2024-02-09_19", 3)
+    if not db_connection.book(reservation):
+        print("Someone else just booked that table.")
+    ```
+    """
+        day, _, time = reservation.user_date.partition("_")
+        if not self.bookable(day):
+            print(f"Error: bookings can only be made from today up to {self.horizon} days ahead.")
+            return None
+        if not time.isdigit() or int(time) not in HOURS:
+            print(f"Error: bookings can only be made at {HOURS[0]}-{HOURS[-1]}.")
+            return None
+        if self.compacted_on != today():
+            self.compact()
+        tables = [reservation.table_id, *joined]
+        try:
+            with self.transaction() as db:
+                cursor = db.cursor()
+
+                # Check if the tables exist
+                if any(len(self.get_tables(table_nr)) == 0 for table_nr in tables):
+                    print("Error: table not found.")
                     return None
+
+                if joined:
+                    placeholders = ",".join("?" * len(tables))
+                    booked = cursor.execute(
+                        f"SELECT 1 FROM table_slots WHERE day=? AND hour=? AND table_nr IN ({placeholders})",
+                        (day, int(time), *tables)).fetchone()
+                    if booked is not None:
+                        return False
+
+                try:
+                    cursor.executemany(
+                        "INSERT INTO table_slots (table_nr, day, hour, reservation_id) VALUES (?, ?, ?, ?)",
+                        [(table_nr, day, int(time), reservation.id) for table_nr in tables])
+                except sqlite3.IntegrityError:
+                    return False
+
+                cursor.execute("INSERT INTO reservation (id, name, amt_guests, date, table_nr) \
+                                VALUES (?, ?, ?, ?, ?)", reservation.to_db_format())
+        except sqlite3.ProgrammingError as p:
+            print(p)
+            return None
+
+        self.table_cache.invalidate(*[("occupied", str(table_nr)) for table_nr in tables])
+        return True
+
+    def insert_reservations_bulk(self, reservations):
+        """
+    Inserts many reservations into the 'reservation' table in one transaction.
+
+    Parameters:
+    - self: The instance of the class representing the database connection.
+    - reservations (iterable): Reservation objects, or tuples (name, amt_guests, date, table_nr) for reservations that
+      do not have an ID yet. Dates use the same "YYYY-MM-DD_Hour" format as Reservation.user_date.
+
+    Returns:
+    - dict: A report with the keys "rows" (reservations saved), "conflicts" (the rows that were skipped because their
+      table was already booked at that time), "invalid" (rows skipped because of non-positive values, an unknown
+      table or a date that book() would not accept either, see bookable()), "seconds" and "rows_per_second".
+
+    Raises:
+    - Any exceptions that may occur during database interaction, after the whole batch has been rolled back.
+
+    Description:
+    This method is meant for importing many bookings at once, for example a partner's group bookings. All rows
+    without an ID get theirs from a single allocate_ids() block. The slots are claimed with one executemany() of
+    INSERT OR IGNORE into 'table_slots', which skips every slot that is already booked, and only the rows whose
+    slot was claimed are inserted into 'reservation' with a second executemany(). Everything happens in one
+    BEGIN IMMEDIATE transaction, so the batch costs one commit no matter how many rows it holds.
+
+    Example:
+    ```
+    db_connection = Database()
+    report = db_connection.insert_reservations_bulk([("Anna", 4, "2024-02-09_19", 5), ("Bo", 2, "2024-02-09_19", 1)])
+    print(report["rows"], "reservations in", report["seconds"], "seconds")
+    ```
+    """
+        started = time.perf_counter()
+        rows = []
+        for reservation in reservations:
+            if isinstance(reservation, Reservation):
+                rows.append(reservation.to_db_format())
             else:
-                print("None digit value was entered.")
+                rows.append((None, *reservation))
 
-            db.commit()
-            self.set_occupied(reservation)
+        with self.transaction() as db:
+            cursor = db.cursor()
+            table_nrs = {table_nr for table_nr, in cursor.execute("SELECT table_nr FROM tables")}
+            # A batch holds few distinct days, so each is checked once
+            days = {day: self.bookable(day) for day in {row[3].split("_")[0] for row in rows}}
+            valid = [row[2] > 0 and row[4] in table_nrs and days[row[3].split("_")[0]] for row in rows]
+            invalid = [row for row, ok in zip(rows, valid) if not ok]
+            rows = [row for row, ok in zip(rows, valid) if ok]
+
+            new_ids = iter(self.allocate_ids("reservation", len(rows)) if rows else ())
+            rows = [row if row[0] != None else (next(new_ids), *row[1:]) for row in rows]
+
+            slots = []
+            for id, name, amt_guests, date, table_nr in rows:
+                day, hour = date.split("_")
+                slots.append((table_nr, day, int(hour), id))
+            cursor.executemany("INSERT OR IGNORE INTO table_slots (table_nr, day, hour, reservation_id) \
+                                VALUES (?, ?, ?, ?)", slots)
+
+            booked = set()
+            for i in range(0, len(rows), 500):
+                ids = [row[0] for row in rows[i:i + 500]]
+                cursor.execute(f"SELECT reservation_id FROM table_slots WHERE reservation_id IN \
+                                ({', '.join('?' * len(ids))})", ids)
+                booked.update(id for id, in cursor.fetchall())
+
+            conflicts = [row for row in rows if row[0] not in booked]
+            rows = [row for row in rows if row[0] in booked]
+            cursor.executemany("INSERT INTO reservation (id, name, amt_guests, date, table_nr) \
+                                VALUES (?, ?, ?, ?, ?)", rows)
+
+        self.table_cache.invalidate(*[("occupied", str(table_nr)) for table_nr in {row[4] for row in rows}])
+        report = throughput(len(rows), started)
+        report["conflicts"] = conflicts
+        report["invalid"] = invalid
+        return report
 
     def remove_reservation(self, id):
         """
@@ -120,7 +945,9 @@ class Database:
     Description:
     This method removes a reservation record from the 'reservation' table in the connected database. The provided
     reservation ID is used to identify the specific record to be deleted. If the ID is not found in the table, an error
-    message is printed. The changes are committed to the database after the execution of the SQL DELETE statement.
+    message is printed. Slots that are still held by the reservation, such as those of tables pushed together for
+    a big party, are freed as well. The changes are committed to the database after the execution of the SQL DELETE
+    statement.
 
     Example:
     ```
@@ -129,13 +956,14 @@ class Database:
     db_connection.remove_reservation(reservation_id_to_remove)
     ```
     """
-        old_length = len(self.get_reservation())
-        with self as db:
+        with self.transaction() as db:
             cursor = db.cursor()
             cursor.execute("DELETE FROM reservation WHERE id=?", (id,))
-            if old_length == len(self.get_reservation()):
+            if cursor.rowcount == 0:
                 print("Error: Id not found.")
-            db.commit()
+            freed = cursor.execute("SELECT table_nr FROM table_slots WHERE reservation_id=?", (id,)).fetchall()
+            cursor.execute("DELETE FROM table_slots WHERE reservation_id=?", (id,))
+        self.table_cache.invalidate(*[("occupied", str(table_nr)) for table_nr, in freed])
 
     def update_reservation(self, data):
         """
@@ -147,17 +975,18 @@ class Database:
 
     Returns:
     - None: Returns None if an exception occurs during the database interaction.
+    - bool: False if the new date or table is already booked, and nothing was changed.
 
     Raises:
     - IndexError: Raised if there's an issue with the index while accessing elements in the 'data' tuple.
     - Any exceptions that may occur during database interaction.
 
     Description:
-    This method updates a reservation record in the 'reservation' table of the connected database. It first checks if
-    the provided reservation ID exists in the table. If the ID is not found, an error message is printed. Otherwise,
-    the function attempts to update the corresponding columns (name, amt_guests, date, table_nr) for the specified
-    reservation ID. If an exception, specifically IndexError, occurs during the SQL execution, it is caught, printed,
-    and the function returns None. The changes are committed to the database.
+    This method updates a reservation record in the 'reservation' table of the connected database. The name and
+    amt_guests columns are written directly. A new date or table goes through move_reservation(), so the booked
+    slots in 'table_slots' move along with the reservation; if the new slot is taken nothing is changed. An error
+    message is printed if no row has that ID. If an exception, specifically IndexError, occurs while reading the
+    'data' tuple, it is caught, printed, and the function returns None. Everything is committed together.
 
     Example:
     ```
@@ -166,18 +995,101 @@ class Database:
     db_connection.update_reservation(updated_reservation_data)
     ```
     """
-        with self as db:
+        try:
+            id, name, amount, date, table_nr = data[0], data[1], data[2], data[3], data[4]
+        except IndexError as i:
+            print(i)
+            return None
+
+        with self.transaction() as db:
             cursor = db.cursor()
-            if self.get_reservation(data[0]) == []:
+            row = cursor.execute("SELECT date, table_nr FROM reservation WHERE id=?", (id,)).fetchone()
+            if row is None:
                 print("Error: Id not found.")
-            else:
-                try:
-                    cursor.execute("UPDATE reservation SET name=?, amt_guests=?, date=?, table_nr=? WHERE id=?",
-                                   (data[1], data[2], data[3], data[4], data[0]))
-                except IndexError as i:
-                    print(i)
+                return None
+            if date != row[0] or table_nr != row[1]:
+                moved = self.move_reservation(id, date if date != row[0] else None,
+                                              table_nr if table_nr != row[1] else None)
+                if not moved:
+                    return moved
+            cursor.execute("UPDATE reservation SET name=?, amt_guests=? WHERE id=?", (name, amount, id))
+
+    def move_reservation(self, id, date=None, table_nr=None):
+        """
+    Moves a reservation to another time and/or table in one transaction.
+
+    Parameters:
+    - self: The instance of the class representing the database connection.
+    - id (int): The ID of the reservation to move.
+    - date (str, optional): The new date in the format "YYYY-MM-DD_Hour". Defaults to the current date.
+    - table_nr (int, optional): The new table. Defaults to the current table.
+
+    Returns:
+    - bool: True if the reservation was moved, False if the new slot is already booked.
+    - None: Returns None if the reservation or the new table does not exist, or the new date cannot be booked.
+
+    Description:
+    Instead of freeing the old slot and claiming the new one with two set_occupied() calls, the reservation's slot
+    row is updated in place: one UPDATE of one row in 'table_slots' and one in 'reservation', committed together.
+    The slot's primary key makes the UPDATE fail if the new slot is taken, and then nothing is changed. Tables that
+    were pushed together for the party follow it to a new time, but are given up when it moves to another table,
+    also when that table is one of them.
+    Only slots that belong to the reservation are ever touched, so another party's booking can never be taken over.
+
+    Example:
+    ```
+    db_connection = YourDatabaseConnection()
+    if not db_connection.move_reservation(12, "2024-02-09_20"):
+        print("That time is already booked.")
+    ```
+    """
+        if date is not None and not self.bookable(date.split("_")[0]):
+            print(f"Error: bookings can only be made from today up to {self.horizon} days ahead.")
+            return None
+        try:
+            with self.transaction() as db:
+                cursor = db.cursor()
+                row = cursor.execute("SELECT date, table_nr FROM reservation WHERE id=?", (id,)).fetchone()
+                if row is None:
+                    print("Error: Id not found.")
+                    return None
+                if table_nr is not None and len(self.get_tables(table_nr)) == 0:
+                    print("Error: table not found.")
                     return None
-            db.commit()
+
+                old_day, old_hour = row[0].split("_")
+                new_day, new_hour = (date or row[0]).split("_")
+                held = [table for table, in cursor.execute(
+                    "SELECT table_nr FROM table_slots WHERE reservation_id=? AND day=? AND hour=? ORDER BY table_nr",
+                    (id, old_day, int(old_hour)))]
+                # The slots say which tables the party really holds, even if the row points at another one
+                old_table = row[1] if not held or row[1] in held else held[0]
+                new_table = old_table if table_nr is None else table_nr
+                joined = [table for table in held if table != old_table]
+
+                if new_table in joined:
+                    # Moving onto one of its own pushed-together tables, that slot is given up first
+                    cursor.execute("DELETE FROM table_slots WHERE table_nr=? AND day=? AND hour=? AND reservation_id=?",
+                                   (new_table, old_day, int(old_hour), id))
+                # Only the reservation's own slot, another party may sit at its old table by now
+                cursor.execute("UPDATE table_slots SET table_nr=?, day=?, hour=? \
+                                WHERE table_nr=? AND day=? AND hour=? AND reservation_id=?",
+                               (new_table, new_day, int(new_hour), old_table, old_day, int(old_hour), id))
+                if cursor.rowcount == 0:
+                    cursor.execute("INSERT INTO table_slots (table_nr, day, hour, reservation_id) VALUES (?, ?, ?, ?)",
+                                   (new_table, new_day, int(new_hour), id))
+                if new_table != old_table:
+                    cursor.execute("DELETE FROM table_slots WHERE reservation_id=? AND table_nr!=?", (id, new_table))
+                else:
+                    cursor.execute("UPDATE table_slots SET day=?, hour=? WHERE reservation_id=? AND table_nr!=?",
+                                   (new_day, int(new_hour), id, new_table))
+                cursor.execute("UPDATE reservation SET date=?, table_nr=? WHERE id=?",
+                               (f"{new_day}_{new_hour}", new_table, id))
+        except sqlite3.IntegrityError:
+            return False
+
+        self.table_cache.invalidate(*[("occupied", str(table)) for table in {old_table, new_table, *joined}])
+        return True
 
     def get_reservation(self, id="*"):
         """
@@ -223,6 +1135,102 @@ class Database:
 
             return cursor.fetchall()
 
+    def get_reservation_by_id(self, id, include_archive=False):
+        """
+    Retrieves a single reservation from the 'reservation' table by its ID.
+
+    Parameters:
+    - self: The instance of the class representing the database connection.
+    - id (int or str): The reservation ID to look up.
+    - include_archive (bool, optional): Also look in the archive tables when the ID is not in the 'reservation'
+      table. Defaults to False.
+
+    Returns:
+    - tuple: The reservation row (id, name, amt_guests, date, table_nr), or None if there is no reservation with
+      that ID.
+
+    Raises:
+    - Any exceptions that may occur during database interaction.
+
+    Description:
+    This method looks the reservation up through the primary key of the 'reservation' table, so it reads one row
+    no matter how many reservations have been made.
+
+    Example:
+    ```
+    db_connection = YourDatabaseConnection()
+    reservation = db_connection.get_reservation_by_id(12)
+    if reservation is None:
+        print("No such reservation.")
+    ```
+    """
+        with self as db:
+            cursor = db.cursor()
+            cursor.execute("SELECT * FROM reservation WHERE id=?", (id,))
+            row = cursor.fetchone()
+
+        if row is None and include_archive:
+            row = next(self.find_reservations({"id": id}), None)
+        return row
+
+    def iter_reservations(self, after_id=0, limit=None, filters=None, page_size=100):
+        """
+    Iterates over the reservations in ID order, one page at a time.
+
+    Parameters:
+    - self: The instance of the class representing the database connection.
+    - after_id (int, optional): Only reservations with a higher ID are returned. Defaults to 0 (from the start).
+    - limit (int, optional): The largest number of reservations to return. Defaults to None (no limit).
+    - filters (dict, optional): Column values the reservations must match, for example {"table_nr": 3}. Allowed
+      columns are name, amt_guests, date and table_nr.
+    - page_size (int, optional): How many rows are read from the database at a time. Defaults to 100.
+
+    Returns:
+    - generator of tuples: Reservation rows (id, name, amt_guests, date, table_nr).
+
+    Raises:
+    - ValueError: Raised if a filter names an unknown column.
+    - Any exceptions that may occur during database interaction.
+
+    Description:
+    This method uses keyset pagination: every page is read with "WHERE id > last seen id ORDER BY id LIMIT
+    page_size", which is a seek on the primary key, so reading page 1000 costs as much as reading page 1. Only one
+    page is kept in memory at a time and the pooled connection is given back between pages, so the generator can
+    be paused (for example while staff read a screen) without blocking anyone. To show the next page of a screen,
+    pass the last ID of the current page as after_id.
+
+    Example:
+    ```
+    db_connection = YourDatabaseConnection()
+
+    # The first 20 reservations
+    first_page = list(db_connection.iter_reservations(limit=20))
+
+    # The next 20 reservations for table 3
+    next_page = list(db_connection.iter_reservations(first_page[-1][0], 20, {"table_nr": 3}))
+    ```
+    """
+        filters = filters or {}
+        for column in filters:
+            if column not in ("name", "amt_guests", "date", "table_nr"):
+                raise ValueError(f"Cannot filter reservations on {column}.")
+        conditions = "".join(f" AND {column}=?" for column in filters)
+
+        returned = 0
+        while limit is None or returned < limit:
+            size = page_size if limit is None else min(page_size, limit - returned)
+            with self as db:
+                cursor = db.cursor()
+                cursor.execute(f"SELECT * FROM reservation WHERE id > ?{conditions} ORDER BY id LIMIT ?",
+                               (after_id, *filters.values(), size))
+                page = cursor.fetchall()
+
+            yield from page
+            returned += len(page)
+            if len(page) < size:
+                return
+            after_id = page[-1][0]
+
     def next_table_nr(self):
         """
     Retrieves the next available table number for a new table in the 'tables' table of the connected database.
@@ -238,8 +1246,9 @@ class Database:
 
     Description:
     This method determines the next available table number for a new table in the 'tables' table of the connected
-    database. It queries the existing table numbers and calculates the maximum value, then increments it to find the next
-    available table number. If no tables exist in the database, the function returns 1 as the starting table number.
+    database. It reserves the number with allocate_ids(), which only moves the table's counter in 'sqlite_sequence'
+    forward instead of scanning every table. If no tables exist in the database, the function returns 1 as the
+    starting table number.
 
     Example:
     ```
@@ -247,17 +1256,7 @@ class Database:
     next_available_table_number = db_connection.next_table_nr()
     ```
     """
-        with self as db:
-            cursor = db.cursor()
-            cursor.execute("SELECT * FROM tables")
-            tables = cursor.fetchall()
-
-            if len(tables) == 0:
-                new_id = 1
-                return new_id
-
-            new_id = max([int(data[0]) for data in tables]) + 1
-            return new_id
+        return self.allocate_ids("tables")[0]
 
     def update_table(self, table: Table):
         """
@@ -277,29 +1276,40 @@ class Database:
     Description:
     This method updates table information in the 'tables' table of the connected database. It first checks if the provided
     table ID exists in the table. If the ID is not found, an error message is printed, and the function returns.
-    Otherwise, the function attempts to update the corresponding columns (capacity, occupied) for the specified table
-    ID. If an exception, specifically IndexError, occurs during the SQL execution, it is caught, printed, and the
-    function returns None. The changes are committed to the database.
+    Otherwise, the function attempts to update the capacity of the specified table ID and brings its rows in
+    'table_slots' in line with the table's booked slots (Table.slots), only touching the slots that differ. If an
+    exception, specifically IndexError, occurs during the SQL execution, it is caught, printed, and the function
+    returns None.
+    The changes are committed to the database.
 
     Example:
     ```
     db_connection = YourDatabaseConnection()
-    table_to_update = Table(id=1, capacity=6, occupied={})
+    table_to_update = Table(db_connection, 6, id=1)
     db_connection.update_table(table_to_update)
     ```
     """
-        with self as db:
+        with self.transaction() as db:
             cursor = db.cursor()
-            if self.get_tables(table.id) == []:
+            old_table = self.get_tables(table.id)
+            if old_table == []:
                 print("Error: Table not found.")
                 return
             try:
-                cursor.execute("UPDATE tables SET capacity=?, occupied=? WHERE table_nr=?",
-                               (table.capacity, json_dumps(table.occupied), table.id))
+                cursor.execute("UPDATE tables SET capacity=? WHERE table_nr=?",
+                               (table.capacity, table.id))
+                # Only the dates the table object covers are compared, bookings on other dates are left alone
+                booked = {(day, hour) for day, hour in cursor.execute(
+                    "SELECT day, hour FROM table_slots WHERE table_nr=?", (table.id,)) if day in table.days}
+                wanted = table.booked_slots()
+                cursor.executemany("DELETE FROM table_slots WHERE table_nr=? AND day=? AND hour=?",
+                                   [(table.id, day, hour) for day, hour in booked - wanted])
+                cursor.executemany("INSERT INTO table_slots (table_nr, day, hour) VALUES (?, ?, ?)",
+                                   [(table.id, day, hour) for day, hour in wanted - booked])
             except IndexError as i:
                 print(i)
                 return None
-            db.commit()
+        self.invalidate_table(table.id, old_table[0][1], table.capacity)
 
     def new_table(self, data: Table):
         """
@@ -327,22 +1337,82 @@ class Database:
     Example:
     ```
     db_connection = YourDatabaseConnection()
-    new_table_data = Table(id=1, capacity=4, occupied=False)
+    new_table_data = Table(db_connection, 4)
     db_connection.new_table(new_table_data)
     ```
     """
-        with self as db:
+        with self.transaction() as db:
             cursor = db.cursor()
             if data.capacity > 0:
                 try:
                     cursor.execute(
-                        "INSERT INTO tables (table_nr, capacity, occupied) VALUES (?, ?, ?)", (data.id, data.capacity, data.occupied))
+                        "INSERT INTO tables (table_nr, capacity) VALUES (?, ?)", (data.id, data.capacity))
+                    cursor.executemany("INSERT INTO table_slots (table_nr, day, hour) VALUES (?, ?, ?)",
+                                       [(data.id, day, hour) for day, hour in data.booked_slots()])
                 except sqlite3.ProgrammingError as p:
                     print(p)
                     return None
             else:
                 print("Non digit value was entered.")
-            db.commit()
+        self.invalidate_table(data.id, data.capacity)
+
+    def new_tables_bulk(self, tables):
+        """
+    Adds many new tables to the 'tables' table in one transaction.
+
+    Parameters:
+    - self: The instance of the class representing the database connection.
+    - tables (iterable): Capacities (int) of new tables, or Table objects that already have a table number.
+
+    Returns:
+    - dict: A report with the keys "rows" (tables added), "table_nrs" (their table numbers), "seconds" and
+      "rows_per_second".
+
+    Raises:
+    - ValueError: Raised if a capacity is not a positive number. Nothing is added in that case.
+    - Any exceptions that may occur during database interaction, after the whole batch has been rolled back.
+
+    Description:
+    This method sets up a whole restaurant at once. New table numbers are taken from a single allocate_ids() block,
+    the tables are inserted with one executemany(), and the booked slots of any Table objects are written to
+    'table_slots' with a second executemany(). Everything is committed together.
+
+    Example:
+    ```
+    db_connection = Database()
+    report = db_connection.new_tables_bulk([2, 2, 4, 4, 6])
+    print(report["table_nrs"])
+    ```
+    """
+        started = time.perf_counter()
+        tables = list(tables)
+        for table in tables:
+            capacity = table.capacity if isinstance(table, Table) else table
+            if not capacity > 0:
+                raise ValueError(f"Capacity {capacity} is not a positive number.")
+
+        with self.transaction() as db:
+            cursor = db.cursor()
+            new_count = sum(1 for table in tables if not isinstance(table, Table))
+            new_ids = iter(self.allocate_ids("tables", new_count) if new_count else ())
+
+            rows = []
+            slots = []
+            for table in tables:
+                if isinstance(table, Table):
+                    rows.append((table.id, table.capacity))
+                    slots.extend((table.id, day, hour) for day, hour in table.booked_slots())
+                else:
+                    rows.append((next(new_ids), table))
+
+            cursor.executemany("INSERT INTO tables (table_nr, capacity) VALUES (?, ?)", rows)
+            cursor.executemany("INSERT INTO table_slots (table_nr, day, hour) VALUES (?, ?, ?)", slots)
+
+        for table_nr, capacity in rows:
+            self.invalidate_table(table_nr, capacity)
+        report = throughput(len(rows), started)
+        report["table_nrs"] = [row[0] for row in rows]
+        return report
 
     def remove_table(self, table_nr):
         """
@@ -372,23 +1442,26 @@ class Database:
     db_connection.remove_table(table_number_to_remove)
     ```
     """
-        old_length = len(self.get_tables())
-        with self as db:
+        old_table = self.get_tables(table_nr)
+        with self.transaction() as db:
             cursor = db.cursor()
             try:
                 cursor.execute(
                     "DELETE FROM tables WHERE table_nr=?", (table_nr,))
+                removed = cursor.rowcount
+                cursor.execute(
+                    "DELETE FROM table_slots WHERE table_nr=?", (table_nr,))
             except sqlite3.InterfaceError as i:
                 print(i)
                 return None
-            if old_length == len(self.get_tables()):
+            if removed == 0:
                 print("Error: Id not found.")
 
-            db.commit()
+        self.invalidate_table(table_nr, *[row[1] for row in old_table])
 
     def set_occupied(self, reservation: Reservation):
         """
-    Updates the 'occupied' status of a table in the 'tables' table of the connected database.
+    Updates the 'occupied' status of a table slot in the 'table_slots' table of the connected database.
 
     Parameters:
     - self: The instance of the class representing the database connection.
@@ -401,12 +1474,11 @@ class Database:
     - Any exceptions that may occur during database interaction.
 
     Description:
-    This method updates the 'occupied' status of a table in the 'tables' table of the connected database based on the
-    provided reservation information. It first checks if the provided table number exists in the table. If the table is
-    not found, an error message is printed. The 'occupied' status of the corresponding table and time slot is toggled
-    between True and False. The function then updates the 'occupied' column for the specified table number in the
-    database. If an exception occurs during the database interaction, it is caught and handled accordingly. The changes
-    are committed to the database.
+    This method updates the 'occupied' status of a table slot based on the provided reservation information. It first
+    checks if the provided table number exists in the table. If the table is not found, an error message is printed.
+    The 'occupied' status of the corresponding table and time slot is toggled between True and False: a booked slot
+    row is deleted, and a free slot gets a new row pointing at the reservation. Only that one slot is written, the
+    rest of the table's timetable is left untouched. The changes are committed to the database.
 
     Example:
     ```
@@ -417,64 +1489,109 @@ class Database:
     db_connection.set_occupied(reservation)
     ```
     """
-        with self as db:
+        with self.transaction() as db:
             cursor = db.cursor()
-            table = self.get_tables(reservation.table_id)
 
             # Check if table exists
-            if len(table) == 0:
+            if len(self.get_tables(reservation.table_id)) == 0:
                 print("Error: table not found.")
                 return
 
             day, time = reservation.user_date.split("_")
-            table = Table.from_db(self, table[0])
+            cursor.execute("DELETE FROM table_slots WHERE table_nr=? AND day=? AND hour=?",
+                           (reservation.table_id, day, int(time)))
+            if cursor.rowcount == 0:
+                cursor.execute("INSERT INTO table_slots (table_nr, day, hour, reservation_id) VALUES (?, ?, ?, ?)",
+                               (reservation.table_id, day, int(time), reservation.id))
+        self.table_cache.invalidate(("occupied", str(reservation.table_id)))
+
+    def reseat(self, day, moves):
+        """
+    Moves reservations to other tables, all in one transaction.
 
-            if table.occupied[day][time] == False:
-                table.occupied[day][time] = True
-            else:
-                table.occupied[day][time] = False
+    Parameters:
+    - self: The instance of the class representing the database connection.
+    - day (str): The day of the moves, for example "2024-02-09".
+    - moves (list of tuple): (reservation_id, hour, old table_nr, new table_nr) for every reservation to move.
 
-            self.update_table(table)
-            db.commit()
+    Returns:
+    - bool: True if every move was saved, False if the bookings changed since the moves were planned.
+
+    Description:
+    Used by seating.optimize_day(). First every old slot is checked to still belong to its reservation. Then all old
+    slots are freed before any new slot is claimed, so two parties can swap tables. If a new slot was booked by
+    someone else in the meantime, the primary key stops the insert and the whole transaction is rolled back, so
+    either all parties move or none of them do.
+
+    Example:
+    ```
+    db_connection = YourDatabaseConnection()
+    db_connection.reseat("2024-02-09", [(12, 19, 3, 5), (14, 19, 5, 3)])
+    ```
+    """
+        try:
+            with self.transaction() as db:
+                cursor = db.cursor()
+                for reservation_id, hour, old_table, _ in moves:
+                    row = cursor.execute("SELECT reservation_id FROM table_slots WHERE table_nr=? AND day=? AND hour=?",
+                                         (old_table, day, hour)).fetchone()
+                    if row is None or row[0] != reservation_id:
+                        return False
+
+                cursor.executemany("DELETE FROM table_slots WHERE table_nr=? AND day=? AND hour=?",
+                                   [(old_table, day, hour) for _, hour, old_table, _ in moves])
+                cursor.executemany(
+                    "INSERT INTO table_slots (table_nr, day, hour, reservation_id) VALUES (?, ?, ?, ?)",
+                    [(new_table, day, hour, reservation_id) for reservation_id, hour, _, new_table in moves])
+                cursor.executemany("UPDATE reservation SET table_nr=? WHERE id=?",
+                                   [(new_table, reservation_id) for reservation_id, _, _, new_table in moves])
+        except sqlite3.IntegrityError:
+            return False
+        finally:
+            self.table_cache.invalidate(*[("occupied", str(table_nr)) for move in moves for table_nr in move[2:]])
+        return True
 
     def get_tables_by_capacity(self, capacity):
         """
-    Retrieves unoccupied tables from the 'tables' table of the connected database based on the provided capacity.
+    Retrieves tables from the 'tables' table of the connected database based on the provided capacity.
 
     Parameters:
     - self: The instance of the class representing the database connection.
     - capacity (int): The capacity of the tables to filter the results.
 
     Returns:
-    - list of tuples: A list containing tuples representing unoccupied tables with the specified capacity.
+    - list of tuples: A list containing tuples (table_nr, capacity) representing tables with the specified capacity.
       Each tuple corresponds to a row in the 'tables' table.
 
     Raises:
     - Any exceptions that may occur during database interaction.
 
     Description:
-    This method retrieves unoccupied tables from the 'tables' table in the connected database based on the provided
-    capacity. The function only returns tables with the specified capacity that are not marked as occupied. The result
-    is a list of tuples, where each tuple contains the values of a row in the 'tables' table.
+    This method retrieves tables from the 'tables' table in the connected database based on the provided capacity.
+    Occupancy is not taken into account, use get_free_tables() to find tables that are free at a given time. The
+    result is a list of tuples, where each tuple contains the values of a row in the 'tables' table.
 
     Example:
     ```
     db_connection = YourDatabaseConnection()
 
-    # Retrieve unoccupied tables with a specific capacity
+    # Retrieve tables with a specific capacity
     tables_with_capacity_4 = db_connection.get_tables_by_capacity(4)
 
-    # Retrieve unoccupied tables with a different capacity
+    # Retrieve tables with a different capacity
     tables_with_capacity_6 = db_connection.get_tables_by_capacity(6)
     ```
     """
-        with self as db:
-            cursor = db.cursor()
+        def load():
+            with self as db:
+                cursor = db.cursor()
 
-            cursor.execute(
-                "SELECT * FROM tables WHERE capacity=?", (capacity,))
+                cursor.execute(
+                    "SELECT * FROM tables WHERE capacity=?", (capacity,))
 
-            return cursor.fetchall()
+                return cursor.fetchall()
+
+        return list(self.cached(("capacity", str(capacity)), load))
 
     def get_tables(self, table_nr="*"):
         """
@@ -510,13 +1627,230 @@ class Database:
     specific_table = db_connection.get_tables(table_number_to_retrieve)
     ```
     """
+        def load():
+            with self as db:
+                cursor = db.cursor()
+
+                if not table_nr == "*":
+                    cursor.execute(
+                        "SELECT * FROM tables WHERE table_nr=?", (table_nr,))
+                else:
+                    cursor.execute("SELECT * FROM tables")
+
+                return cursor.fetchall()
+
+        return list(self.cached(("tables", str(table_nr)), load))
+
+    def get_occupied(self, table_nr, days=None):
+        """
+    Retrieves the timetable of a table for a window of dates from the 'table_slots' table of the connected database.
+
+    Parameters:
+    - self: The instance of the class representing the database connection.
+    - table_nr (int): The table number whose timetable should be retrieved.
+    - days (iterable of str, optional): The dates to cover. Defaults to this week (today and the next six days).
+
+    Returns:
+    - dict: A dictionary mapping every date to a dictionary of hours and their occupancy status (True if booked).
+
+    Raises:
+    - Any exceptions that may occur during database interaction.
+
+    Description:
+    This method builds an empty timetable with gen_timetable() and marks every slot that has a row in 'table_slots'
+    for the given table as occupied.
+
+    Example:
+    ```
+    db_connection = YourDatabaseConnection()
+    timetable = db_connection.get_occupied(1)
+    print(timetable["2024-02-05"][17])
+    ```
+    """
+        def load():
+            with self as db:
+                cursor = db.cursor()
+                cursor.execute("SELECT day, hour FROM table_slots WHERE table_nr=?", (table_nr,))
+                return frozenset(cursor.fetchall())
+
+        occupied = gen_timetable(days)
+        for day, hour in self.cached(("occupied", str(table_nr)), load):
+            if day in occupied:
+                occupied[day][hour] = True
+
+        return occupied
+
+    def get_table_times(self, table_nr, day):
+        """
+    Retrieves the occupancy status of every time slot of one table on one day.
+
+    Parameters:
+    - self: The instance of the class representing the database connection.
+    - table_nr (int): The table number to look up.
+    - day (str): The day to look up, for example "2024-02-05".
+
+    Returns:
+    - dict: A dictionary mapping every hour of the day to True if the table is booked at that hour, otherwise False.
+
+    Raises:
+    - Any exceptions that may occur during database interaction.
+
+    Description:
+    This method reads only the booked slots of the given table and day through the (table_nr, day, hour) primary key
+    of 'table_slots'. The result has the same shape as one day of the timetable, so it can be passed straight to
+    select_time().
+
+    Example:
+    ```
+    db_connection = YourDatabaseConnection()
+    times = db_connection.get_table_times(1, "2024-02-05")
+    ```
+    """
+        times = {hour: False for hour in HOURS}
         with self as db:
             cursor = db.cursor()
+            cursor.execute("SELECT hour FROM table_slots WHERE table_nr=? AND day=?", (table_nr, day))
+            for hour, in cursor.fetchall():
+                times[hour] = True
 
-            if not table_nr == "*":
-                cursor.execute(
-                    "SELECT * FROM tables WHERE table_nr=?", (table_nr,))
-            else:
-                cursor.execute("SELECT * FROM tables")
+        return times
+
+    def get_available_times(self, capacity, day):
+        """
+    Retrieves which time slots of a day still have a free table of the provided capacity.
+
+    Parameters:
+    - self: The instance of the class representing the database connection.
+    - capacity (int): The capacity of the tables to look at.
+    - day (str): The day to look up, for example "2024-02-05".
+
+    Returns:
+    - dict: A dictionary mapping every hour of the day to True if every table of that capacity is booked at that
+      hour (the time is occupied), otherwise False.
+
+    Raises:
+    - Any exceptions that may occur during database interaction.
+
+    Description:
+    This method reads the booked tables per hour for the given capacity from 'slot_summary' and compares the counts
+    with the number of such tables. The result has the same shape as one day of the timetable, so it can be passed
+    straight to select_time().
+
+    Example:
+    ```
+    db_connection = YourDatabaseConnection()
+    times = db_connection.get_available_times(4, "2024-02-09")
+    ```
+    """
+        with self as db:
+            cursor = db.cursor()
+            cursor.execute("SELECT COUNT(*) FROM tables WHERE capacity=?", (capacity,))
+            table_count = cursor.fetchone()[0]
+
+            times = {hour: table_count == 0 for hour in HOURS}
+            cursor.execute("SELECT hour, booked FROM slot_summary WHERE day=? AND capacity=?", (day, capacity))
+            for hour, booked in cursor.fetchall():
+                times[hour] = booked >= table_count
+
+        return times
+
+    def tables_left(self, day, amount):
+        """
+    Counts the free tables that seat a party, for every hour of a day.
+
+    Parameters:
+    - self: The instance of the class representing the database connection.
+    - day (str): The day to look up, for example "2024-02-05".
+    - amount (int): The size of the party. Every table with at least this capacity counts.
+
+    Returns:
+    - dict: A dictionary mapping every hour of the day to the number of free tables that seat the party.
+
+    Raises:
+    - Any exceptions that may occur during database interaction.
+
+    Description:
+    The booked tables per (day, hour, capacity) are kept in 'slot_summary' by triggers (see create_summary()), so
+    the answer is the number of tables that are big enough minus one range lookup on the summary's primary key,
+    however many tables and bookings there are. Tables pushed together are not counted: an hour with 0 tables
+    left can still seat a big party at neighbouring tables (see OccupancyMatrix.available_times()).
+
+    Example:
+    ```
+    db_connection = YourDatabaseConnection()
+    left = db_connection.tables_left("2024-02-09", 4)
+    # {17: 12, 18: 9, 19: 0, 20: 3, 21: 11, 22: 12}
+    ```
+    """
+        with self as db:
+            cursor = db.cursor()
+            table_count = cursor.execute("SELECT COUNT(*) FROM tables WHERE capacity>=?", (amount,)).fetchone()[0]
+            booked = dict(cursor.execute("""SELECT hour, SUM(booked) FROM slot_summary WHERE day=? AND capacity>=?
+                                            GROUP BY hour""", (day, amount)).fetchall())
+
+        return {hour: table_count - booked.get(hour, 0) for hour in HOURS}
+
+    def get_free_tables(self, capacity, day, hour):
+        """
+    Retrieves the tables of the provided capacity that are free at the provided day and hour.
+
+    Parameters:
+    - self: The instance of the class representing the database connection.
+    - capacity (int): The capacity of the tables to look at.
+    - day (str): The day of the reservation, for example "2024-02-05".
+    - hour (int or str): The hour of the reservation, for example 17.
+
+    Returns:
+    - list of tuples: A list containing tuples (table_nr, capacity) of the free tables, ordered by table number.
+
+    Raises:
+    - Any exceptions that may occur during database interaction.
+
+    Description:
+    This method returns every table with the given capacity that has no row in 'table_slots' for the given day and
+    hour. The check is a single query that probes the (table_nr, day, hour) primary key for each table.
+
+    Example:
+    ```
+    db_connection = YourDatabaseConnection()
+    free_tables = db_connection.get_free_tables(4, "2024-02-09", 19)
+    ```
+    """
+        with self as db:
+            cursor = db.cursor()
+            cursor.execute("""SELECT table_nr, capacity FROM tables WHERE capacity=? AND NOT EXISTS
+                            (SELECT 1 FROM table_slots WHERE table_slots.table_nr = tables.table_nr
+                            AND table_slots.day=? AND table_slots.hour=?)
+                            ORDER BY table_nr""", (capacity, day, int(hour)))
 
             return cursor.fetchall()
+
+    def is_occupied(self, table_nr, day, hour):
+        """
+    Checks if a table is booked at the provided day and hour.
+
+    Parameters:
+    - self: The instance of the class representing the database connection.
+    - table_nr (int): The table number to check.
+    - day (str): The day to check, for example "2024-02-05".
+    - hour (int or str): The hour to check, for example 17.
+
+    Returns:
+    - bool: True if the slot is booked, otherwise False.
+
+    Raises:
+    - Any exceptions that may occur during database interaction.
+
+    Example:
+    ```
+    db_connection = YourDatabaseConnection()
+    if db_connection.is_occupied(3, "2024-02-09", 19):
+        print("Table 3 is taken.")
+    ```
+    """
+        with self as db:
+            cursor = db.cursor()
+            cursor.execute("SELECT 1 FROM table_slots WHERE table_nr=? AND day=? AND hour=?",
+                           (table_nr, day, int(hour)))
+
+            return cursor.fetchone() is not None
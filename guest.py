@@ -1,7 +1,6 @@
 from reservations import Reservation
 import datetime
-import database
-from json import loads as json_loads
+from timetable import HORIZON_DAYS, calendar_days
 
 
 def get_party_amount():
@@ -61,13 +60,16 @@ def select_date(weekdays_dict) -> str:
     """
     for i, date in enumerate(weekdays_dict.keys()):
         print(f"{i+1}. {date}")
+    print(f"{len(weekdays_dict)+1}. Another date")
 
     date = input("Please input the date of your reservation:")
     # try:
     date = int(date) - 1
-    if date < 0 or date > 6:
+    if date == len(weekdays_dict):
+        date = select_later_date()
+    elif date < 0 or date > len(weekdays_dict) - 1:
         print("Please input a valid selection.")
-        select_date(weekdays_dict)
+        return select_date(weekdays_dict)
     else:
         date = list(weekdays_dict.values())[date]
     # except:
@@ -77,12 +79,14 @@ def select_date(weekdays_dict) -> str:
     return date
 
 
-def select_time(times: dict) -> str:
+def select_time(times: dict, left=None) -> str:
     """
     Prompts the user to select a time for their reservation from a dictionary of available times.
 
     Parameters:
     - times (dict): A dictionary containing available times as keys and their occupancy status as values.
+    - left (dict, optional): The number of free tables at every time, as returned by Database.tables_left(). Shown
+      next to the free times when given.
 
     Returns:
     - str: The selected time for the reservation.
@@ -102,7 +106,9 @@ def select_time(times: dict) -> str:
     ```
     """
     for i, time in enumerate(times.keys()):
-        if times[time] == False:
+        if times[time] == False and left and left.get(time):
+            print(f"{i+1}. {time}.00 ({left[time]} {'table' if left[time] == 1 else 'tables'} left)")
+        elif times[time] == False:
             print(f"{i+1}. {time}.00")
         else:
             print(f"{i+1}. {time}.00 (Occupied)")
@@ -111,61 +117,83 @@ def select_time(times: dict) -> str:
 
     try:
         time = int(time) - 1
-        if list(times.values())[time] == True:
-            print("Please select a non-occupied time.")
-            select_time(times)
-
         if time < 0 or time > len(times) - 1:
             print("Please input a valid selection.")
-            select_date(times)
+            return select_time(times, left)
+
+        if list(times.values())[time] == True:
+            print("Please select a non-occupied time.")
+            return select_time(times, left)
 
         time = list(times.keys())[time]
 
-    except:
+    except ValueError:
         print("Please input a valid number.")
-        select_date(times)
+        return select_time(times, left)
 
     return time
 
 
+def select_later_date() -> str:
+    """
+    Prompts the user to type a date further ahead than the dates in the list.
+
+    Returns:
+    - str: The date in the format YYYY-MM-DD.
+
+    Description:
+    Bookings can be made up to HORIZON_DAYS days ahead. The user is asked again until a valid date inside that
+    window is typed.
+    """
+    text = input(f"Please input a date within {HORIZON_DAYS} days (YYYY-MM-DD):")
+    try:
+        date = datetime.date.fromisoformat(text.strip()).isoformat()
+    except ValueError:
+        print("Please input a valid date.")
+        return select_later_date()
+
+    if date not in calendar_days(count=HORIZON_DAYS):
+        print(f"Reservations can only be made from today up to {HORIZON_DAYS} days ahead.")
+        return select_later_date()
+    return date
+
+
 def gen_dates() -> dict:
     """
     Generates a dictionary of weekdays for the current week, including today and the next six days.
 
     Returns:
-    - dict: A dictionary where each key represents a day of the week and its corresponding value is the full
-            name of the weekday (e.g., "Monday", "Tuesday").
+    - dict: A dictionary where each key represents a day of the week and its corresponding value is the date
+            of that day in the format YYYY-MM-DD (e.g., "2024-02-05").
 
     Description:
     This function generates a dictionary containing the weekdays for the current week, starting from today and
     including the next six days. It uses the datetime module to calculate the dates and weekdays. The keys in the
     dictionary represent the days of the week (e.g., "Today", "Tomorrow", and the names of the weekdays), while
-    the values are the full names of the corresponding weekdays. The function then returns the generated dictionary.
+    the values are the dates of those days. The function then returns the generated dictionary.
 
     Example:
     ```
     weekdays = gen_dates()
     print(weekdays)
-    # Output: {'Today': 'Monday', 'Tomorrow': 'Tuesday', 'Wednesday': 'Wednesday', ...}
+    # Output: {'Today': '2024-02-05', 'Tomorrow': '2024-02-06', 'Wednesday': '2024-02-07', ...}
     ```
     """
-    now = datetime.datetime.now()
+    now = datetime.date.today()
 
-    # Create a dictionary to hold the current weekday followed by the next 6 weekdays as keys
+    # Create a dictionary to hold today followed by the next 6 days, with the date of each day as the value
     weekdays_dict = {}
 
     # Loop to fill in the dictionary
     for i in range(7):
         # Calculate the date for the current iteration
         date = now + datetime.timedelta(days=i)
-        # Get the weekday name and format the date
-        date_str = date.strftime('%Y-%m-%d')
         if i == 0:
-            weekdays_dict["Today"] = date.strftime('%A')
+            weekdays_dict["Today"] = date.isoformat()
         elif i == 1:
-            weekdays_dict["Tomorrow"] = date.strftime('%A')
+            weekdays_dict["Tomorrow"] = date.isoformat()
         else:
-            weekdays_dict[date.strftime('%A')] = date.strftime('%A')
+            weekdays_dict[date.strftime('%A')] = date.isoformat()
 
     return weekdays_dict
 
@@ -177,11 +205,13 @@ def main():
     Description:
     This function represents the main functionality of the reservation system. It prompts the user to input their name
     and the number of people in their party. Then, it retrieves the available dates for reservation using the
-    'gen_dates()' function and prompts the user to select a date. Next, it creates a new database instance, retrieves
-    available tables based on the party size using 'get_tables_by_capacity()' method, and gets the available times for
-    the selected date. The user is then prompted to select a time slot using 'select_time()' function. Afterward, a new
-    Reservation object is created with the provided details, and it is pushed to the database using 'push_to_db()'
-    method. Finally, a confirmation message is printed to acknowledge the successful reservation.
+    'gen_dates()' function and prompts the user to select a date. Next, it connects to the booking server with
+    'server.open_booking()', which opens the database itself when no server is running, and gets the times of the
+    selected date that still have a free table seating the party. The user is then prompted to select a time slot
+    using 'select_time()' function. Afterward, the reservation is booked with 'book_party()', which picks the
+    smallest free table that fits, or a few neighbouring tables pushed together when no single table is big enough.
+    If another terminal books those tables first, the next best fit is tried. Finally, a confirmation message is
+    printed to acknowledge the successful reservation.
 
     Example:
     ```
@@ -211,16 +241,25 @@ def main():
     print()
     date = select_date(gen_dates())
 
-    db = database.Database()
-    available_tables = db.get_tables_by_capacity(amount)
-    available_times = json_loads(available_tables[0][2])[date]
+    # Imported only now, sqlite3 is the slowest part of starting the program and the prompts above do not need it
+    from server import open_booking
+    db = open_booking()
+    # One lookup in the booking summary tells how many tables that seat the party are left at every hour
+    left = db.tables_left(date, amount)
+    available_times = {hour: count == 0 for hour, count in left.items()}
+    if not all(left.values()):
+        # An hour without a single free table may still seat the party at neighbouring tables pushed together
+        available_times = db.available_times(amount, date)
 
     print()
-    time = select_time(available_times)
-
-    reservation = Reservation(db,
-                              amount, name, f"{date}_{time}", available_tables[0][0])
-    reservation.push_to_db()
+    time = select_time(available_times, left)
+
+    # Picks the smallest free table, or neighbouring tables pushed together, and retries if another terminal was quicker
+    booked = db.book_party(amount, name, date, time)
+    db.close()
+    if booked is None:
+        print("Sorry, there are no free tables for your party at that time.")
+        return
 
     print(
         f"Thank you {name}, your reservation for {amount} people on {date}, {time}:00 has been made.")
@@ -0,0 +1,227 @@
+import functools
+import inspect
+import json
+import threading
+import time
+from bisect import bisect_left
+
+
+# Upper bounds in milliseconds of the latency histogram buckets, the last bucket takes everything slower
+BUCKETS_MS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+
+# Database methods that are not timed: they are plumbing, or would hold a pooled connection for too long
+NOT_INSTRUMENTED = ("close", "cached", "transaction", "start_archiver", "invalidate_table", "cache_stats", "bookable")
+
+
+class MethodStats:
+    __slots__ = ("calls", "errors", "seconds", "max_seconds", "rows_read", "rows_written", "connections_opened",
+                 "buckets")
+
+    def __init__(self) -> None:
+        self.calls = 0
+        self.errors = 0
+        self.seconds = 0.0
+        self.max_seconds = 0.0
+        self.rows_read = 0
+        self.rows_written = 0
+        self.connections_opened = 0
+        self.buckets = [0] * (len(BUCKETS_MS) + 1)
+
+    def percentile_ms(self, fraction):
+        # The upper bound of the bucket that holds the given share of the calls, but never more than the slowest call
+        wanted = fraction * self.calls
+        seen = 0
+        for bound, count in zip(BUCKETS_MS, self.buckets):
+            seen += count
+            if seen >= wanted:
+                return min(bound, self.max_seconds * 1000)
+        return self.max_seconds * 1000
+
+    def to_dict(self) -> dict:
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "total_ms": self.seconds * 1000,
+            "mean_ms": self.seconds / self.calls * 1000 if self.calls else 0.0,
+            "p50_ms": self.percentile_ms(0.50) if self.calls else 0.0,
+            "p99_ms": self.percentile_ms(0.99) if self.calls else 0.0,
+            "max_ms": self.max_seconds * 1000,
+            "rows_read": self.rows_read,
+            "rows_written": self.rows_written,
+            "connections_opened": self.connections_opened,
+            "histogram": {f"<={bound}ms": count for bound, count in zip(BUCKETS_MS, self.buckets)} |
+                         {f">{BUCKETS_MS[-1]}ms": self.buckets[-1]},
+        }
+
+
+class Metrics:
+    """
+    Call counts, latency histograms, rows and connection opens for every method of one Database.
+
+    Description:
+    Nothing is measured unless the database is created with Database(instrument=True). Then instrument() replaces
+    the public methods of that one Database object with timed wrappers, so a database without instrumentation
+    runs the very same code as before and pays nothing. Every call records:
+    - its latency, in a fixed bucket histogram (BUCKETS_MS) that gives p50/p99 without keeping every sample,
+    - rows read: the rows a method returns (a list counts its length, a single row counts 1) or yields,
+    - rows written: the change in the connection's total_changes during the call,
+    - connections the pool had to open during the call, and whether the call raised.
+    A method that calls another one (book() calls get_tables()) is counted for both, with the inner time included
+    in the outer one.
+
+    Example:
+    ```
+    db = Database(instrument=True)
+    db.metrics.start_dump(60, "metrics.jsonl")
+    ...
+    print(db.metrics.snapshot()["methods"]["insert_reservation"])
+    ```
+    """
+
+    def __init__(self) -> None:
+        self.started = time.time()
+        self.methods = {}
+        self.pool = None
+        self.dumper = None
+        self.dump_stop = threading.Event()
+        self._lock = threading.Lock()
+
+    def instrument(self, db):
+        self.pool = db.pool
+        for name, method in inspect.getmembers(type(db), inspect.isfunction):
+            if name.startswith("_") or name in NOT_INSTRUMENTED:
+                continue
+            bound = getattr(db, name)
+            if inspect.isgeneratorfunction(method):
+                setattr(db, name, self.wrap_generator(db, name, bound))
+            else:
+                setattr(db, name, self.wrap(db, name, bound))
+
+    def record(self, name, seconds, failed, read=0, written=0, opened=0):
+        with self._lock:
+            stats = self.methods.get(name)
+            if stats is None:
+                stats = self.methods[name] = MethodStats()
+            stats.calls += 1
+            stats.errors += failed
+            stats.seconds += seconds
+            stats.max_seconds = max(stats.max_seconds, seconds)
+            stats.rows_read += read
+            stats.rows_written += written
+            stats.connections_opened += opened
+            stats.buckets[bisect_left(BUCKETS_MS, seconds * 1000)] += 1
+
+    def wrap(self, db, name, method):
+        @functools.wraps(method)
+        def timed(*args, **kwargs):
+            opened = db.pool.opened
+            # Holding the thread's connection for the call makes total_changes count only this call's writes
+            with db as conn:
+                changes = conn.total_changes
+                started = time.perf_counter()
+                failed = True
+                result = None
+                try:
+                    result = method(*args, **kwargs)
+                    failed = False
+                    return result
+                finally:
+                    seconds = time.perf_counter() - started
+                    if isinstance(result, list):
+                        read = len(result)
+                    else:
+                        read = 1 if isinstance(result, tuple) else 0
+                    self.record(name, seconds, failed, read, conn.total_changes - changes, db.pool.opened - opened)
+
+        return timed
+
+    def wrap_generator(self, db, name, method):
+        # Generators give their connection back between pages, so only the time spent inside them is counted
+        @functools.wraps(method)
+        def timed(*args, **kwargs):
+            opened = db.pool.opened
+            seconds = 0.0
+            rows = 0
+            failed = True
+            iterator = method(*args, **kwargs)
+            try:
+                while True:
+                    started = time.perf_counter()
+                    try:
+                        row = next(iterator)
+                    except StopIteration:
+                        seconds += time.perf_counter() - started
+                        break
+                    seconds += time.perf_counter() - started
+                    rows += 1
+                    yield row
+                failed = False
+            except GeneratorExit:
+                # The caller stopped reading early, for example after one page, which is not an error
+                failed = False
+                raise
+            finally:
+                iterator.close()
+                self.record(name, seconds, failed, rows, 0, db.pool.opened - opened)
+
+        return timed
+
+    def snapshot(self) -> dict:
+        """
+    Returns everything measured so far.
+
+    Returns:
+    - dict: "uptime_seconds", "calls" in total, "connections_opened" by the pool since it was created and
+      "methods", mapping every called method to its counters
+      (calls, errors, total/mean/p50/p99/max milliseconds, rows_read, rows_written, connections_opened and the
+      latency histogram). The methods are ordered by total time, slowest first.
+    """
+        with self._lock:
+            methods = sorted(self.methods.items(), key=lambda item: item[1].seconds, reverse=True)
+            return {
+                "uptime_seconds": time.time() - self.started,
+                "calls": sum(stats.calls for _, stats in methods),
+                "connections_opened": self.pool.opened if self.pool else 0,
+                "methods": {name: stats.to_dict() for name, stats in methods},
+            }
+
+    def reset(self):
+        with self._lock:
+            self.methods = {}
+            self.started = time.time()
+
+    def dump(self, path=None):
+        # Appends one JSON line with a timestamped snapshot to `path`, or prints a short table without a path
+        snapshot = self.snapshot()
+        if path is not None:
+            with open(path, "a") as file:
+                file.write(json.dumps({"time": time.time(), **snapshot}) + "\n")
+            return
+
+        print(f"{'method':<26}{'calls':>8}{'errors':>8}{'p50 ms':>10}{'p99 ms':>10}{'read':>10}{'written':>10}")
+        for name, stats in snapshot["methods"].items():
+            print(f"{name:<26}{stats['calls']:>8}{stats['errors']:>8}{stats['p50_ms']:>10}{stats['p99_ms']:>10}"
+                  f"{stats['rows_read']:>10}{stats['rows_written']:>10}")
+
+    def start_dump(self, interval=60.0, path=None):
+        """
+    Calls dump() on a background thread every `interval` seconds until stop_dump() is called.
+
+    Parameters:
+    - interval (float, optional): Seconds between dumps. Defaults to one minute.
+    - path (str, optional): The JSON lines file to append to. Defaults to printing.
+    """
+        def run():
+            while not self.dump_stop.wait(interval):
+                self.dump(path)
+
+        if self.dumper is None:
+            self.dump_stop.clear()
+            self.dumper = threading.Thread(target=run, name="metrics", daemon=True)
+            self.dumper.start()
+
+    def stop_dump(self):
+        self.dump_stop.set()
+        if self.dumper is not None:
+            self.dumper.join()
+            self.dumper = None
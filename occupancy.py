@@ -0,0 +1,311 @@
+from bisect import bisect_left
+from timetable import HOURS, week, window_mask
+
+
+# The most tables that are pushed together for one party
+MAX_COMBINED = 3
+
+
+class OccupancyMatrix:
+    """
+    The occupancy of every table for a window of dates, loaded once from the database.
+
+    Description:
+    Every table's window is packed into one int with one bit per (day, hour) slot, where a set bit means booked
+    (see timetable.slot_index for the layout). The window is this week unless other dates are given, and only the
+    slots of those dates are read, so a guest looking at one evening three months ahead only loads that evening.
+    The tables are kept sorted by capacity, so all tables that fit a party are a suffix of the list. For every
+    suffix the bitwise AND of the masks is kept as well: a slot that is set in that AND is booked at every table
+    that fits. Questions like "which times still have a table for 4" or "when is the first free slot for 6" are
+    therefore answered with one bit operation over the whole window instead of looping over nested dicts.
+
+    Example:
+    ```
+    db = Database()
+    matrix = OccupancyMatrix.from_db(db)
+    times = matrix.available_times(4, "2024-02-09")
+    tables = matrix.free_tables(4, "2024-02-09", 19)
+    ```
+    """
+
+    @staticmethod
+    def from_db(db, days=None):
+        days = tuple(days or week())
+        with db as conn:
+            tables = conn.execute("SELECT table_nr, capacity FROM tables").fetchall()
+            placeholders = ",".join("?" * len(days))
+            slots = conn.execute(f"SELECT table_nr, day, hour FROM table_slots WHERE day IN ({placeholders})",
+                                 days).fetchall()
+
+        matrix = OccupancyMatrix(tables, days)
+        for table_nr, day, hour in slots:
+            if table_nr in matrix.index and hour in HOURS:
+                matrix.masks[matrix.index[table_nr]] |= matrix.bit(day, hour)
+        matrix.rebuild()
+        return matrix
+
+    def __init__(self, tables, days=None) -> None:
+        self.days = tuple(days or week())
+        self.day_index = {day: i for i, day in enumerate(self.days)}
+        self.full = window_mask(self.days)
+        tables = sorted(tables, key=lambda table: (table[1], table[0]))
+        self.table_nrs = [table[0] for table in tables]
+        self.capacities = [table[1] for table in tables]
+        self.index = {table_nr: i for i, table_nr in enumerate(self.table_nrs)}
+        # Neighbouring table numbers stand next to each other and can be pushed together for a big party
+        self.by_number = sorted(self.table_nrs)
+        self.position = {table_nr: p for p, table_nr in enumerate(self.by_number)}
+        # (capacity, combine) -> runs(), the tables never change so neither do the runs
+        self._runs = {}
+        self.masks = [0] * len(tables)
+        self.rebuild()
+
+    def rebuild(self):
+        # booked_everywhere[i] is the AND of masks[i:], the extra last entry stands for "no tables" (all booked)
+        self.booked_everywhere = [self.full] * (len(self.masks) + 1)
+        for i in range(len(self.masks) - 1, -1, -1):
+            self.booked_everywhere[i] = self.booked_everywhere[i + 1] & self.masks[i]
+        # columns[slot] has bit p set when table by_number[p] is booked at that slot, the masks turned sideways
+        self.columns = [0] * len(self.days) * len(HOURS)
+        for p, table_nr in enumerate(self.by_number):
+            mask = self.masks[self.index[table_nr]]
+            while mask:
+                self.columns[(mask & -mask).bit_length() - 1] |= 1 << p
+                mask &= mask - 1
+
+    def slot(self, day, hour) -> int:
+        # The index of a (day, hour) slot, like timetable.slot_index() but with a dict lookup for the day
+        return self.day_index[day] * len(HOURS) + HOURS.index(int(hour))
+
+    def bit(self, day, hour) -> int:
+        return 1 << self.slot(day, hour)
+
+    def day_bits(self, day) -> int:
+        return ((1 << len(HOURS)) - 1) << self.day_index[day] * len(HOURS)
+
+    def first_fitting(self, capacity) -> int:
+        # Index of the first table that seats `capacity` guests
+        return bisect_left(self.capacities, capacity)
+
+    def mark(self, table_nr, day, hour, occupied=True):
+        i = self.index[table_nr]
+        if occupied:
+            self.masks[i] |= self.bit(day, hour)
+            self.columns[self.slot(day, hour)] |= 1 << self.position[table_nr]
+        else:
+            self.masks[i] &= ~self.bit(day, hour)
+            self.columns[self.slot(day, hour)] &= ~(1 << self.position[table_nr])
+
+        for j in range(i, -1, -1):
+            self.booked_everywhere[j] = self.booked_everywhere[j + 1] & self.masks[j]
+
+    def is_free(self, table_nr, day, hour) -> bool:
+        return not self.masks[self.index[table_nr]] & self.bit(day, hour)
+
+    def free_slots(self, capacity) -> int:
+        # Bitmask of every slot in the window where at least one table seating `capacity` is free
+        return ~self.booked_everywhere[self.first_fitting(capacity)] & self.full
+
+    def free_tables(self, capacity, day=None, hour=None) -> list:
+        """
+    Lists the tables that seat at least `capacity` guests and are free, smallest table first.
+
+    Parameters:
+    - capacity (int): The size of the party.
+    - day (str, optional): The date to check. Leave out to accept a table that is free at any slot of the window.
+    - hour (int, optional): The hour to check. Leave out to accept a table that is free at any hour of `day`.
+
+    Returns:
+    - list of int: The table numbers, ordered by capacity and then table number.
+    """
+        if day is None:
+            wanted = self.full
+        elif hour is None:
+            wanted = self.day_bits(day)
+        else:
+            wanted = self.bit(day, hour)
+
+        return [self.table_nrs[i] for i in range(self.first_fitting(capacity), len(self.masks))
+                if ~self.masks[i] & wanted]
+
+    def runs(self, capacity, combine=MAX_COMBINED) -> list:
+        """
+    Groups every run of neighbouring tables that seats `capacity` guests, whether it is free or not.
+
+    Parameters:
+    - capacity (int): The size of the party.
+    - combine (int, optional): The most tables in one run. Defaults to MAX_COMBINED.
+
+    Returns:
+    - list of tuple: (length, starts) for every group of runs with the same seats and number of tables, the fewest
+      spare seats first, then the fewest tables. Bit p of `starts` is set when a run of `length` tables begins at
+      by_number[p].
+
+    Description:
+    Tables count as neighbours when their numbers follow each other. Every run starts at one table and stops as
+    soon as it seats the party, so no run contains a table that is not needed, and single tables are left out. The
+    tables of a matrix never change, only their bookings do, so the groups are built once per capacity and kept.
+    """
+        key = (capacity, combine)
+        if key not in self._runs:
+            groups = {}
+            for start in range(len(self.by_number)):
+                seats = 0
+                for end in range(start, min(start + combine, len(self.by_number))):
+                    if end > start and self.by_number[end] != self.by_number[end - 1] + 1:
+                        break
+                    seats += self.capacities[self.index[self.by_number[end]]]
+                    if seats >= capacity:
+                        if end > start:
+                            groups[seats, end - start + 1] = groups.get((seats, end - start + 1), 0) | 1 << start
+                        break
+            self._runs[key] = [(length, groups[seats, length]) for seats, length in sorted(groups)]
+        return self._runs[key]
+
+    def free_starts(self, capacity, day, hour, combine=MAX_COMBINED):
+        # Yields (length, starts) like runs(), but only with the runs that are free at the slot
+        booked = self.columns[self.slot(day, hour)]
+        # blocked[length] has bit p set when one of the `length` tables from by_number[p] on is booked
+        blocked = {1: booked}
+        for length, starts in self.runs(capacity, combine):
+            for extra in range(len(blocked) + 1, length + 1):
+                blocked[extra] = blocked[extra - 1] | booked >> extra - 1
+            free = starts & ~blocked[length]
+            if free:
+                yield length, free
+
+    def free_runs(self, capacity, day, hour, combine=MAX_COMBINED):
+        # The free runs as table numbers, best first, worked out only as far as they are taken
+        for length, free in self.free_starts(capacity, day, hour, combine):
+            while free:
+                start = (free & -free).bit_length() - 1
+                yield tuple(self.by_number[start:start + length])
+                free &= free - 1
+
+    def combined_tables(self, capacity, day, hour, combine=MAX_COMBINED) -> list:
+        """
+    Lists the runs of neighbouring free tables that together seat at least `capacity` guests.
+
+    Parameters:
+    - capacity (int): The size of the party.
+    - day (str): The day to check.
+    - hour (int): The hour to check.
+    - combine (int, optional): The most tables in one run. Defaults to MAX_COMBINED.
+
+    Returns:
+    - list of tuple: The runs of table numbers, the fewest spare seats first, then the fewest tables.
+
+    Description:
+    Besides the per-table masks the matrix keeps one int per slot with a bit for every table in table number order
+    (see columns), so shifting it tells for all runs of one length at once whether they are free. Only the best run
+    is needed to book, so allocations() and best_fit() use free_runs() and stop at the first one.
+    """
+        return list(self.free_runs(capacity, day, hour, combine))
+
+    def allocations(self, capacity, day, hour, combine=MAX_COMBINED):
+        """
+    Yields every way to seat a party at one slot, the best fit first.
+
+    Parameters:
+    - capacity (int): The size of the party.
+    - day (str): The day to check.
+    - hour (int): The hour to check.
+    - combine (int, optional): The most neighbouring tables to push together. 1 only offers single tables.
+
+    Yields:
+    - tuple of int: The table numbers to book, the first one is the reservation's own table.
+
+    Description:
+    Single free tables come first, smallest first: the bisect on the capacity index skips every table that is too
+    small and the suffix AND in booked_everywhere tells in one bit test if any single table is left at all. Only
+    when no single table fits are neighbouring tables combined (see runs()), because that takes more tables out of
+    use. The runs are tried lazily, so best_fit() only tests them until the first free one.
+    """
+        bit = self.bit(day, hour)
+        first = self.first_fitting(capacity)
+        if not self.booked_everywhere[first] & bit:
+            for i in range(first, len(self.masks)):
+                if not self.masks[i] & bit:
+                    yield (self.table_nrs[i],)
+        if combine > 1:
+            yield from self.free_runs(capacity, day, hour, combine)
+
+    def best_fit(self, capacity, day, hour, combine=MAX_COMBINED):
+        # The smallest free table, or run of tables, for the party, or None if it cannot be seated
+        return next(self.allocations(capacity, day, hour, combine), None)
+
+    def available_times(self, capacity, day, combine=MAX_COMBINED) -> dict:
+        """
+    Tells for every hour of a day if a party of `capacity` guests can still get a table.
+
+    Parameters:
+    - capacity (int): The size of the party.
+    - day (str): The date to look at, for example "2024-02-05".
+    - combine (int, optional): The most neighbouring tables that may be pushed together. Defaults to MAX_COMBINED.
+
+    Returns:
+    - dict: A dictionary mapping every hour of the day to True if the party cannot be seated (the time is occupied),
+      otherwise False. It can be passed straight to select_time().
+
+    Description:
+    The hours with a free single table come from free_slots(). For the rest it only matters whether some run of
+    neighbouring tables is free, not which one is best, so free_starts() is asked for its first group only.
+    """
+        free = self.free_slots(capacity)
+        return {hour: not free & self.bit(day, hour)
+                and (combine < 2 or next(self.free_starts(capacity, day, hour, combine), None) is None)
+                for hour in HOURS}
+
+    def table_times(self, table_nr, day) -> dict:
+        # Same shape as available_times(), but for one single table
+        mask = self.masks[self.index[table_nr]]
+        return {hour: bool(mask & self.bit(day, hour)) for hour in HOURS}
+
+    def first_free_slot(self, capacity):
+        """
+    Finds the earliest slot of the window where a party of `capacity` guests can get a table.
+
+    Parameters:
+    - capacity (int): The size of the party.
+
+    Returns:
+    - tuple: (day, hour) of the first free slot, or None if the whole window is full for that party size.
+    """
+        free = self.free_slots(capacity)
+        if free == 0:
+            return None
+        index = (free & -free).bit_length() - 1
+        return self.days[index // len(HOURS)], HOURS[index % len(HOURS)]
+
+
+def seat(db, matrix, reservation, day, hour, combine=MAX_COMBINED):
+    """
+    Books the best fitting free table, or run of tables, for a reservation.
+
+    Parameters:
+    - db (Database): The database to book in.
+    - matrix (OccupancyMatrix): The occupancy to pick tables from. It is updated with the booking.
+    - reservation (Reservation): The reservation to save. Its table_id is set to the first booked table.
+    - day (str): The day of the booking.
+    - hour (int): The hour of the booking.
+    - combine (int, optional): The most neighbouring tables to push together. Defaults to MAX_COMBINED.
+
+    Returns:
+    - tuple of int: The booked table numbers, or None if no table fits the party any more.
+
+    Description:
+    The matrix can be out of date when another terminal books in between, so the options from allocations() are
+    tried in order until Database.book() manages to claim one. The guest and staff programs both seat parties
+    through this function, so they always pick tables the same way.
+    """
+    for tables in matrix.allocations(reservation.user_amount, day, hour, combine):
+        reservation.table_id = tables[0]
+        if db.book(reservation, tables[1:]):
+            for table_nr in tables:
+                matrix.mark(table_nr, day, hour)
+            return tables
+        # Someone else was quicker, so the matrix is stale for this slot
+        for table_nr in tables:
+            if db.is_occupied(table_nr, day, hour):
+                matrix.mark(table_nr, day, hour)
+    return None
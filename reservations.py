@@ -1,5 +1,3 @@
-import sqlite3
-from json import loads as json_loads
 
 
 class Reservation:
@@ -29,7 +27,8 @@ class Reservation:
         return "This is not possible.\n Cant make reservation for more than 8 people.\nThis is a restaurant not a circus."
 
     def push_to_db(self):
-        self.db.insert_reservation(self)
+        # Returnerar False om bordet hann bokas av någon annan
+        return self.db.insert_reservation(self)
 
     def to_db_format(self):
         # Metod för att spara bokningar i databasen
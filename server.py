@@ -0,0 +1,442 @@
+import argparse
+import ipaddress
+import multiprocessing
+import os
+import random
+import secrets
+import sqlite3
+import tempfile
+import threading
+from multiprocessing.connection import Client, Listener
+from batching import WriteBatcher
+from database import Database
+from occupancy import MAX_COMBINED, OccupancyMatrix, seat
+from reservations import Reservation
+from seating import optimize_day
+
+
+ADDRESS = ("127.0.0.1", 6543)
+# Requests are pickled, and unpickling runs code, so clients must prove they know a secret key first. The key is
+# made once per install and kept in a file only its owner can read, or given in BOOKING_SERVER_KEY (hex).
+KEY_FILE = os.path.join(os.path.expanduser("~"), ".reservations_server.key")
+KEY_VARIABLE = "BOOKING_SERVER_KEY"
+
+# What the reader processes answer, straight from their own Database
+READS = (
+    "get_reservation_by_id",
+    "get_tables",
+    "get_tables_by_capacity",
+    "get_occupied",
+    "get_table_times",
+    "get_available_times",
+    "tables_left",
+    "get_free_tables",
+    "is_occupied",
+    "bookable",
+    "available_times",
+    "free_tables",
+    "availability",
+    "reservations_page",
+)
+
+# What goes through the writer queue, run by one writer thread in batches that share a commit
+WRITES = (
+    "book_party",
+    "remove_reservation",
+    "update_reservation",
+    "move_reservation",
+    "reseat",
+    "optimize_day",
+)
+
+
+def load_authkey(path=KEY_FILE) -> bytes:
+    """
+    Returns this install's server key, creating it the first time.
+
+    Parameters:
+    - path (str, optional): The key file. Defaults to KEY_FILE in the home directory.
+
+    Returns:
+    - bytes: The key from the BOOKING_SERVER_KEY environment variable if it is set, otherwise from the key file.
+      A missing file is created with 32 random bytes and permissions 0600.
+
+    Raises:
+    - ValueError: If the key file is empty.
+
+    Description:
+    The server, its readers and the clients may all start at the same moment. The new key is therefore written to
+    a temporary file first and then linked into place in one step, so nobody can read a half written key. Whoever
+    links first wins, and everybody else reads that key.
+    """
+    if os.environ.get(KEY_VARIABLE):
+        return bytes.fromhex(os.environ[KEY_VARIABLE])
+    if not os.path.exists(path):
+        descriptor, temporary = tempfile.mkstemp(dir=os.path.dirname(path) or ".", prefix=".reservations_key")
+        try:
+            with os.fdopen(descriptor, "wb") as file:
+                file.write(secrets.token_bytes(32))
+            os.link(temporary, path)
+        except FileExistsError:
+            pass
+        finally:
+            os.remove(temporary)
+    with open(path, "rb") as file:
+        key = file.read()
+    if not key:
+        raise ValueError(f"The server key file {path} is empty, delete it to make a new key.")
+    return key
+
+
+def check_loopback(host):
+    # The server must never be reachable from other machines
+    if host != "localhost" and not ipaddress.ip_address(host).is_loopback:
+        raise ValueError(f"The booking server only listens on localhost, not on {host}.")
+
+
+def book_party(db, amount, name, day, hour, combine=MAX_COMBINED):
+    # Seats a party at the best free table(s) like guest.py does, returns (reservation id, tables) or None
+    if not db.bookable(day):
+        return None
+    reservation = Reservation(db, amount, name, f"{day}_{hour}", 0)
+    tables = seat(db, OccupancyMatrix.from_db(db, [day]), reservation, day, hour, combine)
+    return (reservation.id, tables) if tables else None
+
+
+def available_times(db, amount, day, combine=MAX_COMBINED):
+    # OccupancyMatrix.available_times() of one date, for terminals that do not read the database themselves
+    return OccupancyMatrix.from_db(db, [day]).available_times(amount, day, combine)
+
+
+def free_tables(db, amount, day, hour):
+    # The single tables that seat the party and are free at that time, smallest first
+    return OccupancyMatrix.from_db(db, [day]).free_tables(amount, day, hour)
+
+
+def availability(db, days, sizes):
+    # available_times() of every date for every party size, read from one matrix
+    matrix = OccupancyMatrix.from_db(db, days)
+    return {(day, size): matrix.available_times(size, day) for day in days for size in sizes}
+
+
+def reservations_page(db, after_id=0, limit=20):
+    # One page of Database.iter_reservations(), as a list so it can be sent to the client
+    return list(db.iter_reservations(after_id, limit))
+
+
+# Requests that are not Database methods, called with the Database as first argument
+OPERATIONS = {"book_party": book_party, "optimize_day": optimize_day, "available_times": available_times,
+              "free_tables": free_tables, "availability": availability, "reservations_page": reservations_page}
+
+
+def call(db, name, args, kwargs):
+    operation = OPERATIONS.get(name)
+    if operation is not None:
+        return operation(db, *args, **kwargs)
+    return getattr(db, name)(*args, **kwargs)
+
+
+def handle(conn, answer):
+    # Answers the requests of one client connection until the client hangs up
+    with conn:
+        while True:
+            try:
+                name, args, kwargs = conn.recv()
+            except (EOFError, OSError):
+                return
+            try:
+                reply = (True, answer(name, args, kwargs))
+            except Exception as error:
+                reply = (False, error)
+            conn.send(reply)
+
+
+def accept_loop(listener, answer, stopped):
+    # Every client connection gets its own thread
+    while True:
+        try:
+            conn = listener.accept()
+        except (OSError, EOFError, multiprocessing.AuthenticationError):
+            if stopped.is_set():
+                return
+            continue
+        if stopped.is_set():
+            conn.close()
+            return
+        threading.Thread(target=handle, args=(conn, answer), daemon=True).start()
+
+
+def read_worker(path, authkey, addresses, pool_size):
+    # One reader process with its own Database and listener, it only answers READS
+    db = Database(path, pool_size=pool_size)
+    listener = Listener(("127.0.0.1", 0), authkey=authkey)
+    addresses.put(listener.address)
+
+    def answer(name, args, kwargs):
+        if name not in READS:
+            raise ValueError(f"{name} is not a read request.")
+        return call(db, name, args, kwargs)
+
+    try:
+        accept_loop(listener, answer, threading.Event())
+    finally:
+        listener.close()
+        db.close()
+
+
+class BookingServer:
+    """
+    A local booking service that owns the database, so terminals do not have to open db.db themselves.
+
+    Description:
+    Every guest or staff terminal that opens db.db takes SQLite's write lock on its own, and with more than a
+    handful of them they mostly wait for each other. The server takes that job away from them:
+    - all writes (see WRITES) are put on one queue and run by one writer thread with its own Database, so SQLite
+      never sees two writers and nobody waits on a busy lock. The writer is a batching.WriteBatcher, so writes
+      that arrive together share one commit,
+    - reads (see READS) are answered by `workers` reader processes, each with its own Database and socket, so
+      they run on all cores instead of sharing one interpreter. WAL mode lets them read while the writer writes.
+    Clients talk to it with BookingClient, which sends every read to one of the readers and every write to the
+    server itself. Requests and replies are pickled Python objects over multiprocessing connections, so the server
+    only listens on a loopback address and every connection must authenticate with the key from load_authkey().
+    Table management (new_tables_bulk, remove_table) is left to setup_tables.py and cannot be called. Finished
+    reservations are archived every `archive_interval` seconds through the writer queue, like the staff terminal
+    does when it runs without a server.
+
+    Example:
+    ```
+    server = BookingServer("./db.db", workers=4).start()
+    with BookingClient(server.address) as client:
+        print(client.get_available_times(4, "2024-02-09"))
+        print(client.book_party(4, "Anna", "2024-02-09", 19))
+    server.close()
+    ```
+    """
+
+    def __init__(self, path="./db.db", address=ADDRESS, workers=None, authkey=None, reader_pool_size=4,
+                 max_batch=64, max_delay=0.002, archive_interval=3600.0, **kwargs):
+        check_loopback(address[0])
+        # Opening the writer's Database first runs the migrations before any reader starts
+        self.db = Database(path, **kwargs)
+        self.path = path
+        self.address = address
+        self.workers = workers or os.cpu_count() or 1
+        self.authkey = authkey or load_authkey()
+        self.reader_pool_size = reader_pool_size
+        self.readers = []
+        self.reader_addresses = []
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.archive_interval = archive_interval
+        self.writer = None
+        self.listener = None
+        self.stopped = threading.Event()
+
+    def start(self):
+        """
+    Starts the reader processes, the writer thread and the listener, and returns without blocking.
+
+    Returns:
+    - BookingServer: The server itself. Its `address` is the one clients connect to.
+    """
+        addresses = multiprocessing.Queue()
+        for _ in range(self.workers):
+            process = multiprocessing.Process(target=read_worker, daemon=True,
+                                              args=(self.path, self.authkey, addresses, self.reader_pool_size))
+            process.start()
+            self.readers.append(process)
+        self.reader_addresses = [addresses.get() for _ in self.readers]
+
+        self.writer = WriteBatcher(self.db, self.max_batch, self.max_delay)
+        self.listener = Listener(self.address, authkey=self.authkey)
+        self.address = self.listener.address
+        threading.Thread(target=accept_loop, args=(self.listener, self.answer, self.stopped), daemon=True).start()
+        if self.archive_interval:
+            threading.Thread(target=self.archive_loop, args=(self.writer,), name="archiver", daemon=True).start()
+        return self
+
+    def archive_loop(self, writer):
+        # Database.start_archiver() would write next to the writer thread, so archive() goes through its queue
+        while not self.stopped.is_set():
+            try:
+                writer.submit(self.db.archive).result()
+            except sqlite3.Error as e:
+                print(e)
+            self.stopped.wait(self.archive_interval)
+
+    def answer(self, name, args, kwargs):
+        if name == "readers":
+            return self.reader_addresses
+        if name in READS:
+            # Clients without a reader of their own are answered here, outside the writer queue
+            return call(self.db, name, args, kwargs)
+        if name not in WRITES:
+            raise ValueError(f"Unknown request {name}.")
+
+        return self.writer.submit(call, self.db, name, args, kwargs).result()
+
+    def serve_forever(self):
+        # Runs until Ctrl+C
+        self.start()
+        print(f"Booking server on {self.address[0]}:{self.address[1]} with {self.workers} readers")
+        try:
+            self.stopped.wait()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.close()
+
+    def close(self):
+        """
+    Stops accepting clients, lets the writer finish the queued writes and stops the reader processes.
+    """
+        if self.listener is not None and not self.stopped.is_set():
+            self.stopped.set()
+            # accept() does not notice a closed socket, so wake it with one last connection
+            try:
+                Client(self.address, authkey=self.authkey).close()
+            except OSError:
+                pass
+            self.listener.close()
+        self.stopped.set()
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+        for process in self.readers:
+            process.terminate()
+            process.join()
+        self.readers = []
+        self.db.close()
+
+
+class BookingClient:
+    """
+    Talks to a BookingServer with the same method names and return values as Database.
+
+    Description:
+    The client connects to the server, asks it for its reader processes and picks one of them at random, so many
+    clients spread their reads over all readers. The methods in READS are sent to that reader, the ones in WRITES
+    to the server. An exception raised by the server is raised again by the method. One client is one pair of
+    connections, so give every thread its own client.
+
+    Example:
+    ```
+    with BookingClient() as client:
+        if client.book_party(2, "Anna", "2024-02-09", 19) is None:
+            print("Fully booked.")
+    ```
+    """
+
+    def __init__(self, address=ADDRESS, authkey=None) -> None:
+        authkey = authkey or load_authkey()
+        self.writer = Client(address, authkey=authkey)
+        readers = self.request(self.writer, "readers", (), {})
+        self.reader = Client(random.choice(readers), authkey=authkey) if readers else self.writer
+
+    def request(self, conn, name, args, kwargs):
+        conn.send((name, args, kwargs))
+        ok, value = conn.recv()
+        if not ok:
+            raise value
+        return value
+
+    def close(self):
+        if self.reader is not self.writer:
+            self.reader.close()
+        self.writer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class LocalClient:
+    """
+    The same methods as BookingClient, answered by a Database of its own, for when no booking server is running.
+
+    Description:
+    The terminals only use the READS and WRITES of the booking service, so they run unchanged against a server
+    or, through this class, straight against db.db. Every call runs what the server would run for it.
+
+    Example:
+    ```
+    with LocalClient("./db.db") as client:
+        print(client.tables_left("2024-02-09", 4))
+    ```
+    """
+
+    def __init__(self, path="./db.db", **kwargs) -> None:
+        self.db = Database(path, **kwargs)
+
+    def close(self):
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def open_booking(path="./db.db", address=ADDRESS):
+    """
+    Connects a terminal to the booking server, or opens the database itself when no server is running.
+
+    Parameters:
+    - path (str, optional): The database to open without a server. Defaults to "./db.db".
+    - address (tuple, optional): The server's (host, port). Defaults to ADDRESS.
+
+    Returns:
+    - BookingClient or LocalClient: Either way the terminal calls the same methods and gets the same answers.
+    """
+    try:
+        return BookingClient(address)
+    except ConnectionRefusedError:
+        return LocalClient(path)
+    except multiprocessing.AuthenticationError:
+        print("Error: the booking server did not accept this terminal's key, opening the database directly.")
+        return LocalClient(path)
+
+
+def mirror(name, side):
+    def method(self, *args, **kwargs):
+        return self.request(getattr(self, side), name, args, kwargs)
+
+    method.__name__ = name
+    method.__qualname__ = f"BookingClient.{name}"
+    method.__doc__ = f"Runs {name}() on the booking server's {side}."
+    return method
+
+
+def local(name):
+    def method(self, *args, **kwargs):
+        return call(self.db, name, args, kwargs)
+
+    method.__name__ = name
+    method.__qualname__ = f"LocalClient.{name}"
+    method.__doc__ = f"Runs {name}() on the local database."
+    return method
+
+
+for name in READS:
+    setattr(BookingClient, name, mirror(name, "reader"))
+for name in WRITES:
+    setattr(BookingClient, name, mirror(name, "writer"))
+for name in READS + WRITES:
+    setattr(LocalClient, name, local(name))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local booking server for the restaurant database.")
+    parser.add_argument("--path", default="./db.db")
+    parser.add_argument("--host", default=ADDRESS[0], help="a loopback address, other hosts are refused")
+    parser.add_argument("--port", type=int, default=ADDRESS[1])
+    parser.add_argument("--workers", type=int, default=None, help="reader processes, defaults to the core count")
+    arguments = parser.parse_args()
+    BookingServer(arguments.path, (arguments.host, arguments.port), arguments.workers).serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -14,8 +14,14 @@ import sqlite3
 # cur.execute("DROP TABLE tables")
 # cur.execute(''' CREATE TABLE IF NOT EXISTS tables
 #             (table_nr INTEGER,
-#             capacity INTEGER,
-#             occupied TEXT)
+#             capacity INTEGER)
+# ''')
+# cur.execute(''' CREATE TABLE IF NOT EXISTS table_slots
+#             (table_nr INTEGER NOT NULL,
+#             day TEXT NOT NULL,
+#             hour INTEGER NOT NULL,
+#             reservation_id INTEGER,
+#             PRIMARY KEY (table_nr, day, hour)) WITHOUT ROWID
 # ''')
 
 # cur.close()
@@ -23,3 +29,6 @@ import sqlite3
 
 # Det här är ett schema för vår databas där all information
 # sparas i ordningen ovan där id i int osv. frågor mejla niklas
+# Bokade tider ligger i table_slots, en rad per bokad tid.
+# Det gällande schemat (med index) finns i database.SCHEMAS och database.INDEXES
+# och skapas eller uppgraderas av Database.migrate() varje gång Database() startar.
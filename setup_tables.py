@@ -2,18 +2,5 @@ from table import Table
 from database import Database
 
 # db = Database()
-# for i in range(4):
-#     table = Table(db, 2)
-#     table.push_to_db()
-
-# for i in range(6):
-#     table = Table(db, 4)
-#     table.push_to_db()
-
-# for i in range(6):
-#     table = Table(db, 6)
-#     table.push_to_db()
-
-# for i in range(6):
-#     table = Table(db, 6)
-#     table.push_to_db()
+# report = db.new_tables_bulk([2] * 4 + [4] * 6 + [6] * 6 + [6] * 6)
+# print(f"{report['rows']} tables added, {report['rows_per_second']:.0f} tables/s")
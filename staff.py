@@ -1,12 +1,31 @@
 from os import system, name
-from database import Database
-from reservations import Reservation
 import datetime
-from json import loads as json_loads
-from table import Table
+from timetable import HORIZON_DAYS, calendar_days
 
 
-database = Database("./db.db")
+# Opened by get_database() on first use, so the menu is on screen before the database is touched
+database = None
+PAGE_SIZE = 20
+
+
+def get_database():
+    """
+    Returns the terminal's connection to the bookings, opening it the first time.
+
+    Description:
+    The terminal talks to the booking server when one is running and only opens db.db itself when none is (see
+    server.open_booking). Either way it calls the same methods. Without a server, opening the database runs its
+    migrations and compaction, and finished reservations are archived in the background from then on (see
+    Database.start_archiver); a server archives them itself. None of that is needed to draw the menu, so it waits
+    until the first action that reads or writes a reservation.
+    """
+    global database
+    if database is None:
+        from server import LocalClient, open_booking
+        database = open_booking("./db.db")
+        if isinstance(database, LocalClient):
+            database.db.start_archiver()
+    return database
 
 
 def clear():
@@ -16,6 +35,48 @@ def clear():
         system("clear")
 
 
+def choose_reservation(title) -> str:
+    """
+    Function to let the user pick a reservation from a paged list.
+
+    This function lists the reservations PAGE_SIZE at a time, oldest first, and returns what the user typed.
+    Entering "n" shows the next page.
+
+    Parameters:
+    - title (str): The heading shown above the list.
+
+    Returns:
+    - str: The user's input, normally a reservation id or an empty string.
+
+    Raises:
+    - None
+
+    Description:
+    The pages are read with `reservations_page`, which continues after the last id of the previous page, so
+    only one page of reservations is loaded at a time no matter how many reservations the database holds.
+
+    Example:
+    ```
+    choice = choose_reservation("Remove reservation")
+    ```
+    """
+    after_id = 0
+    while True:
+        clear()
+        print(f"\n{title}\nSelect id\n")
+        page = get_database().reservations_page(after_id, PAGE_SIZE)
+        for i in page:
+            print(f"{i[0]}. {i[1]}")
+        if len(page) == PAGE_SIZE:
+            print("\nn. Next page")
+
+        choice = input("\n")
+        if choice.lower() == "n" and len(page) == PAGE_SIZE:
+            after_id = page[-1][0]
+            continue
+        return choice
+
+
 def remove_reservation():
     """
     Function to remove a reservation from the database.
@@ -24,8 +85,7 @@ def remove_reservation():
     After selecting a reservation, it presents the details of the reservation and asks for confirmation
     to remove it. If confirmed, it removes the reservation from the database.
 
-    Note: This function relies on a global variable `database` which should be an instance of the class
-    representing the database connection.
+    Note: This function opens the database through `get_database()` if it is not open yet.
 
     Parameters:
     - None
@@ -40,24 +100,20 @@ def remove_reservation():
     This function displays a list of reservations from the database and prompts the user to select one
     by entering its ID. It then presents the details of the selected reservation and asks for confirmation
     to remove it. If confirmed, it removes the reservation from the database using the `remove_reservation`
-    method of the `database` instance.
+    method of the database returned by `get_database()`.
 
     Example:
     ```
     remove_reservation()
     ```
     """
-    clear()
-    print("\nRemove reservation\nSelect id\n")
-    for i in database.get_reservation():
-        print(f"{i[0]}. {i[1]}")
-    choice = input("\n")
+    choice = choose_reservation("Remove reservation")
     try:
         if choice != "":
-            for i in database.get_reservation():
-                if int(choice) == i[0]:
-                    clear()
-                    print(f"""
+            i = get_database().get_reservation_by_id(int(choice))
+            if i is not None:
+                clear()
+                print(f"""
 Reservation info
 
 Id: {i[0]}
@@ -65,19 +121,17 @@ Name: {i[1]}
 Amount of guessts: {i[2]}
 Date: {i[3]}
 Table number: {i[4]}
-                        """)
-                    confirmation = input(
-                        "Are you sure you want to remove this reservation, y or n?\n")
-                    if confirmation == "y" or confirmation == "Y":
-                        db_data = database.get_reservation(choice)
-                        reservation = Reservation.from_db(database, db_data)
-                        database.set_occupied(reservation)
-                        database.remove_reservation(choice)
-                    elif confirmation == "n" or confirmation == "N":
-                        break
-                    else:
-                        print("Non accepted value entered, interpreted as n.")
-                        input()
+                    """)
+                confirmation = input(
+                    "Are you sure you want to remove this reservation, y or n?\n")
+                if confirmation == "y" or confirmation == "Y":
+                    # Frees the reservation's slots as well
+                    get_database().remove_reservation(choice)
+                elif confirmation == "n" or confirmation == "N":
+                    return
+                else:
+                    print("Non accepted value entered, interpreted as n.")
+                    input()
 
     except ValueError:
         print("\nEntered id was of invalid value.")
@@ -114,13 +168,16 @@ def select_date(weekdays_dict) -> str:
     clear()
     for i, date in enumerate(weekdays_dict.keys()):
         print(f"{i+1}. {date}")
+    print(f"{len(weekdays_dict)+1}. Another date")
 
     date = input("Please input the date of your reservation:")
     # try:
     date = int(date) - 1
-    if date < 0 or date > 6:
+    if date == len(weekdays_dict):
+        date = select_later_date()
+    elif date < 0 or date > len(weekdays_dict) - 1:
         print("Please input a valid selection.")
-        select_date(weekdays_dict)
+        return select_date(weekdays_dict)
     else:
         date = list(weekdays_dict.values())[date]
     # except:
@@ -130,6 +187,30 @@ def select_date(weekdays_dict) -> str:
     return date
 
 
+def select_later_date() -> str:
+    """
+    Prompts the user to type a date further ahead than the dates in the list.
+
+    Returns:
+    - str: The date in the format YYYY-MM-DD.
+
+    Description:
+    Bookings can be made up to HORIZON_DAYS days ahead. The user is asked again until a valid date inside that
+    window is typed.
+    """
+    text = input(f"Please input a date within {HORIZON_DAYS} days (YYYY-MM-DD):")
+    try:
+        date = datetime.date.fromisoformat(text.strip()).isoformat()
+    except ValueError:
+        print("Please input a valid date.")
+        return select_later_date()
+
+    if date not in calendar_days(count=HORIZON_DAYS):
+        print(f"Reservations can only be made from today up to {HORIZON_DAYS} days ahead.")
+        return select_later_date()
+    return date
+
+
 def gen_dates() -> dict:
     """
     Function to generate a dictionary of weekday names and corresponding dates for the next 7 days.
@@ -167,23 +248,21 @@ def gen_dates() -> dict:
     # }
     ```
     """
-    now = datetime.datetime.now()
+    now = datetime.date.today()
 
-    # Create a dictionary to hold the current weekday followed by the next 6 weekdays as keys
+    # Create a dictionary to hold today followed by the next 6 days, with the date of each day as the value
     weekdays_dict = {}
 
     # Loop to fill in the dictionary
     for i in range(7):
         # Calculate the date for the current iteration
         date = now + datetime.timedelta(days=i)
-        # Get the weekday name and format the date
-        date_str = date.strftime('%Y-%m-%d')
         if i == 0:
-            weekdays_dict["Today"] = date.strftime('%A')
+            weekdays_dict["Today"] = date.isoformat()
         elif i == 1:
-            weekdays_dict["Tomorrow"] = date.strftime('%A')
+            weekdays_dict["Tomorrow"] = date.isoformat()
         else:
-            weekdays_dict[date.strftime('%A')] = date.strftime('%A')
+            weekdays_dict[date.strftime('%A')] = date.isoformat()
 
     return weekdays_dict
 
@@ -250,8 +329,8 @@ def select_new_reservation_date(amount, table_number):
 
     This function prompts the user to select a date and time for a new reservation based on the given table's
     available capacities and timeslots. It first prompts the user to select a date using the `select_date` function
-    with available dates generated by `gen_dates`. Then, it retrieves the available timeslots for the given table
-    and date from the database. Finally, it prompts the user to select a time from the available timeslots using
+    with available dates generated by `gen_dates`. Then, it reads the timeslots of the given table on that date with
+    `get_table_times`. Finally, it prompts the user to select a time from the available timeslots using
     the `select_time` function, and returns the concatenated string of the selected date and time.
 
     Parameters:
@@ -277,10 +356,7 @@ def select_new_reservation_date(amount, table_number):
     """
     date = select_date(gen_dates())
 
-    available_tables = database.get_tables_by_capacity(amount)
-    for i in available_tables:
-        if i[0] == table_number:
-            available_times = json_loads(i[2])[date]
+    available_times = get_database().get_table_times(table_number, date)
 
     time = select_time(available_times)
 
@@ -292,10 +368,10 @@ def select_new_reservation_table(amount, date, old_table_id):
     Function to select a new table for a reservation.
 
     This function prompts the user to select a new table for a reservation, based on the required capacity,
-    the provided date, and the current table ID. It first displays available tables with the required capacity
-    retrieved from the database. The user is prompted to select a new table by entering its index. The function
-    then validates the selection and ensures that the selected table is available at the booked time. If the
-    selection is invalid or the table is not available, the user is prompted to input a valid selection.
+    the provided date, and the current table ID. It first displays the current table followed by every table that
+    seats the party and is free at the booked time, smallest first, as listed by `free_tables` on the server.
+    The user is prompted to select a new table by entering its index. If the selection is invalid, the user is
+    prompted to input a valid selection.
 
     Parameters:
     - amount (int): The capacity required for the reservation.
@@ -320,34 +396,29 @@ def select_new_reservation_table(amount, date, old_table_id):
     # Output: 3
     ```
     """
-    avalible_tables = database.get_tables_by_capacity(amount)
-    print(f"Avalible tables with capasity {amount}")
+    day, hour = date.split("_")
+    # The same best fit order as the guest program: the smallest free table that seats the party comes first
+    avalible_tables = [old_table_id] + get_database().free_tables(amount, day, hour)
+    print(f"Avalible tables for {amount} guests")
     for i in range(len(avalible_tables)):
-        if avalible_tables[i][0] == old_table_id:
-            print(f"{i+1}. Id: {avalible_tables[i][0]} (Current)")
+        if avalible_tables[i] == old_table_id:
+            print(f"{i+1}. Id: {avalible_tables[i]} (Current)")
         else:
-            print(f"{i+1}. Id: {avalible_tables[i][0]}")
+            print(f"{i+1}. Id: {avalible_tables[i]}")
 
     new_table = input("Please select the new table for the reservation: ")
 
     try:
         new_table = int(new_table) - 1
-        table = Table.from_db(database, avalible_tables[new_table])
-        date_list = date.split("_")
-        if table.occupied[date_list[0]][date_list[1]] == True:
-            print(
-                "The selected table is not avalible at the booked time, please select another table.")
-            select_new_reservation_table(amount, date, old_table_id)
-
         if new_table < 0 or new_table > len(avalible_tables) - 1:
             print("Please input a valid selection.")
-            select_new_reservation_table(amount, date, old_table_id)
+            return select_new_reservation_table(amount, date, old_table_id)
 
-    except:
+    except ValueError:
         print("Please input a valid number.")
-        select_new_reservation_table(amount, date, old_table_id)
+        return select_new_reservation_table(amount, date, old_table_id)
 
-    return table.id
+    return avalible_tables[new_table]
 
 
 def update_reservation():
@@ -378,17 +449,13 @@ def update_reservation():
     update_reservation()
     ```
     """
-    clear()
-    print("\nUpdate reservation\nSelect id\n")
-    for i in database.get_reservation():
-        print(f"{i[0]}. {i[1]}")
-    choice = input("\n")
+    choice = choose_reservation("Update reservation")
     try:
         if choice != "":
-            for i in database.get_reservation():
-                if int(choice) == i[0]:
-                    clear()
-                    print(f"""
+            i = get_database().get_reservation_by_id(int(choice))
+            if i is not None:
+                clear()
+                print(f"""
 Reservation info
 
 Id: {i[0]}
@@ -396,62 +463,48 @@ Id: {i[0]}
 2. Amount of guessts: {i[2]}
 3. Date: {f"{i[3].split('_')[0]}, {i[3].split('_')[1]}:00"}
 4. Table number: {i[4]}
-                        """)
-                    info_choice = input(
-                        "Enter the info you wish to update.\nId's cannot be updated.\n").lower()
-                    match info_choice:
-                        case "1":
-                            new_name = input(
-                                "Enter the new name: ").capitalize()
-                            database.update_reservation(
-                                (i[0], new_name, i[2], i[3], i[4]))
-                        case "2":
-                            while True:
-                                try:
-                                    new_amount_of_guests = int(input("Enter the new amount of guests:"))
-                                    if new_amount_of_guests > i[2]:
-                                        print("New number of guests cannot exceed current value. Try again.")
-                                        input("Press ENTER to continue.")
-                                        continue
-                                    
-                                    if new_amount_of_guests <= 0:
-                                        print("New number of guests be zero or less than zero. Try again.")
-                                        input("Press ENTER to continue.")
-                                        continue
-                                    break
-                                except KeyboardInterrupt:
-                                    exit()
-                                except:
-                                    print("Invalid input. Try again.")
-                            database.update_reservation(
-                                (i[0], i[1], new_amount_of_guests, i[3], i[4])) 
-                        case "3":
-                            new_date = select_new_reservation_date(i[2], i[4])
-                            database.update_reservation(
-                                (i[0], i[1], i[2], new_date, i[4]))
-                            updated_reservation = Reservation(
-                                db=database, user_amount=i[2], user_name=i[1], user_date=new_date, table_id=i[4])
-                            updated_reservation.id = i[0]
-                            database.set_occupied(updated_reservation)
-                            old_reservation = Reservation(
-                                db=database, user_amount=i[2], user_name=i[1], user_date=i[3], table_id=i[4])
-                            old_reservation.id = i[0]
-                            database.set_occupied(old_reservation)
-                        case "4":
-                            new_table_nr = select_new_reservation_table(
-                                i[2], i[3], i[4])
-                            database.update_reservation(
-                                (i[0], i[1], i[2], i[3], new_table_nr))
-                            updated_reservation = Reservation(
-                                db=database, user_amount=i[2], user_name=i[1], user_date=i[3], table_id=new_table_nr)
-                            updated_reservation.id = i[0]
-                            database.set_occupied(updated_reservation)
-                            old_reservation = Reservation(
-                                db=database, user_amount=i[2], user_name=i[1], user_date=i[3], table_id=i[4])
-                            old_reservation.id = i[0]
-                            database.set_occupied(old_reservation)
-                        case other:
-                            pass
+                    """)
+                info_choice = input(
+                    "Enter the info you wish to update.\nId's cannot be updated.\n").lower()
+                match info_choice:
+                    case "1":
+                        new_name = input(
+                            "Enter the new name: ").capitalize()
+                        get_database().update_reservation(
+                            (i[0], new_name, i[2], i[3], i[4]))
+                    case "2":
+                        while True:
+                            try:
+                                new_amount_of_guests = int(input("Enter the new amount of guests:"))
+                                if new_amount_of_guests > i[2]:
+                                    print("New number of guests cannot exceed current value. Try again.")
+                                    input("Press ENTER to continue.")
+                                    continue
+                                
+                                if new_amount_of_guests <= 0:
+                                    print("New number of guests be zero or less than zero. Try again.")
+                                    input("Press ENTER to continue.")
+                                    continue
+                                break
+                            except KeyboardInterrupt:
+                                exit()
+                            except:
+                                print("Invalid input. Try again.")
+                        get_database().update_reservation(
+                            (i[0], i[1], new_amount_of_guests, i[3], i[4])) 
+                    case "3":
+                        new_date = select_new_reservation_date(i[2], i[4])
+                        if get_database().move_reservation(i[0], date=new_date) is False:
+                            print("That time was just booked by someone else.")
+                            input("Press enter to continue.")
+                    case "4":
+                        new_table_nr = select_new_reservation_table(
+                            i[2], i[3], i[4])
+                        if get_database().move_reservation(i[0], table_nr=new_table_nr) is False:
+                            print("That table was just booked by someone else.")
+                            input("Press enter to continue.")
+                    case other:
+                        pass
 
     except ValueError:
         print("\nEntered id was of invalid value.")
@@ -487,17 +540,13 @@ def display_reservations():
     ```
     """
     while True:
-        clear()
-        print("\nReservations\nSelect id\n")
-        for i in database.get_reservation():
-            print(f"{i[0]}. {i[1]}")
-        choice = input("\n")
+        choice = choose_reservation("Reservations")
         try:
             if choice != "":
-                for i in database.get_reservation():
-                    if int(choice) == i[0]:
-                        clear()
-                        print(f"""
+                i = get_database().get_reservation_by_id(int(choice))
+                if i is not None:
+                    clear()
+                    print(f"""
 Reservation info
 
 Id: {i[0]}
@@ -505,9 +554,8 @@ Name: {i[1]}
 Amount of guessts: {i[2]}
 Date: {f"{i[3].split('_')[0]}, {i[3].split('_')[1]}:00"}
 Table number: {i[4]}
-                            """)
-                        input()
-                        break
+                        """)
+                    input()
             else:
                 break
         except ValueError:
@@ -515,13 +563,52 @@ Table number: {i[4]}
             input("Press enter to try again.")
 
 
+def optimize_seating():
+    """
+    Function to reseat a whole day of reservations at the best fitting tables.
+
+    This function asks for a day, lets `seating.optimize_day` plan the seating for every hour of that day without
+    saving it, and shows which parties would move and how many empty seats that saves. If the staff member
+    confirms, all moves are saved in one transaction with `get_database().reseat`.
+
+    Parameters:
+    - None
+
+    Returns:
+    - None
+
+    Example:
+    ```
+    optimize_seating()
+    ```
+    """
+    day = select_date(gen_dates())
+    report = get_database().optimize_day(day, apply=False)
+    clear()
+    print(f"Optimized seating for {day} in {report['seconds'] * 1000:.0f} ms\n")
+    if not report["moves"]:
+        print("The seating is already the best it can be.")
+        input("Press enter to continue.")
+        return
+
+    for reservation_id, hour, old_table, new_table in report["moves"]:
+        print(f"Reservation {reservation_id} at {hour}:00: table {old_table} -> table {new_table}")
+    print(f"\nEmpty seats at booked tables: {report['wasted_before']} -> {report['wasted_after']}")
+
+    confirmation = input("Do you want to apply the new seating, y or n?\n")
+    if confirmation == "y" or confirmation == "Y":
+        if not get_database().reseat(day, report["moves"]):
+            print("The bookings changed in the meantime, please try again.")
+            input("Press enter to continue.")
+
+
 def menu():
     """
     Function to display and navigate the staff terminal menu.
 
     This function continuously displays a menu for staff terminal options and prompts the user to select 
     an action by entering a corresponding number. The user can choose to remove a reservation, update a 
-    reservation, display reservations, or exit the terminal. The function then directs the user to the 
+    reservation, display reservations, optimize the seating of a day, or exit the terminal. The function then directs the user to the 
     respective action based on their input.
 
     Parameters:
@@ -551,17 +638,21 @@ Staff terminal
 1. Remove reservation
 2. Update reservation
 3. Display reservations
-4. Exit
+4. Optimize seating
+5. Exit
             """)
         match input("Enter your choice: "):
             case "1": remove_reservation()
             case "2": update_reservation()
             case "3": display_reservations()
-            case "4": break
+            case "4": optimize_seating()
+            case "5": break
             case other:
-                print("\nYou must only select either 1, 2, 3, or 4.")
+                print("\nYou must only select either 1, 2, 3, 4, or 5.")
                 input("Press enter to try again.")
 
 
 if __name__ == "__main__":
     menu()
+    if database is not None:
+        database.close()
@@ -1,25 +1,32 @@
-from timetable import gen_timetable
-from json import loads as json_loads
-from json import dumps as json_dumps
+from timetable import week, slot_from_index
 
 
 class Table:
-    @staticmethod
-    def from_db(db, db_data: list):
-        table = Table(db, db_data[1])
-        table.id = db_data[0]
-        table.occupied = json_loads(db_data[2])
-        return table
+    __slots__ = ("db", "id", "capacity", "days", "slots")
 
-    def __init__(self, db, capacity: int) -> None:
+    def __init__(self, db, capacity: int, id=None, days=None) -> None:
         self.db = db
-        self.id = self.db.next_table_nr()
+        self.id = self.db.next_table_nr() if id == None else id
         self.capacity = capacity
-        self.occupied = gen_timetable()
+        # The dates the timetable covers, this week unless other dates are given
+        self.days = tuple(days or week())
+        # The whole window packed into one int, bit slot_index(day, hour, days) is set when that slot is booked.
+        # new_table() and update_table() write these slots, the bookings themselves are read with OccupancyMatrix.
+        self.slots = 0
 
     def __str__(self) -> str:
-        return f"Table {self.id}, capacity: {self.capacity}, occupied: {json_dumps(self.occupied, indent=2)}"
+        booked = ", ".join(f"{day} {hour}:00" for day, hour in sorted(self.booked_slots()))
+        return f"Table {self.id}, capacity: {self.capacity}, occupied: {booked or 'none'}"
+
+    def booked_slots(self) -> set:
+        # Every booked (day, hour), in the same shape as the rows in table_slots
+        booked = set()
+        slots = self.slots
+        while slots:
+            lowest = slots & -slots
+            booked.add(slot_from_index(lowest.bit_length() - 1, self.days))
+            slots ^= lowest
+        return booked
 
     def push_to_db(self):
-        self.occupied = json_dumps(self.occupied)
         self.db.new_table(self)
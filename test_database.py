@@ -0,0 +1,239 @@
+import multiprocessing
+import threading
+import pytest
+from batching import WriteBatcher
+from database import Database
+from reservations import Reservation
+from seating import optimize_day
+from table import Table
+from timetable import calendar_days
+
+
+# Processes that try to book the same slot at the same moment
+RACERS = 8
+
+
+@pytest.fixture
+def path(tmp_path):
+    db = Database(str(tmp_path / "db.db"))
+    db.new_tables_bulk([2, 4, 4, 6])
+    db.close()
+    return str(tmp_path / "db.db")
+
+
+@pytest.fixture
+def db(path):
+    db = Database(path)
+    yield db
+    db.close()
+
+
+def day(offset=1):
+    return calendar_days(count=offset + 1)[offset]
+
+
+def slot_rows(db, reservation_id):
+    with db as conn:
+        return conn.execute("SELECT table_nr, day, hour FROM table_slots WHERE reservation_id=? ORDER BY table_nr",
+                            (reservation_id,)).fetchall()
+
+
+def race(path, name, tables, date, start, results):
+    # One terminal: opens its own Database, waits for the others and books
+    db = Database(path)
+    reservation = Reservation(db, 2, name, date, tables[0])
+    start.wait()
+    results.put((name, db.book(reservation, tables[1:])))
+    db.close()
+
+
+def run_race(path, claims):
+    start = multiprocessing.Barrier(len(claims))
+    results = multiprocessing.Queue()
+    processes = [multiprocessing.Process(target=race, args=(path, name, tables, f"{day()}_19", start, results))
+                 for name, tables in claims]
+    for process in processes:
+        process.start()
+    booked = dict(results.get(timeout=60) for _ in processes)
+    for process in processes:
+        process.join()
+    return booked
+
+
+def test_double_booking_race(path):
+    booked = run_race(path, [(f"Guest {i}", (2,)) for i in range(RACERS)])
+
+    assert sorted(booked.values()) == [False] * (RACERS - 1) + [True]
+    db = Database(path)
+    with db as conn:
+        assert conn.execute("SELECT count(*) FROM table_slots").fetchone() == (1,)
+        assert conn.execute("SELECT name FROM reservation").fetchall() == \
+            [(name,) for name, ok in booked.items() if ok]
+    db.close()
+
+
+def test_joined_tables_race(path):
+    # Every claim overlaps its neighbours, so at most two of them can win
+    booked = run_race(path, [("A", (1, 2)), ("B", (2, 3)), ("C", (3, 4)), ("D", (1, 2, 3))])
+
+    db = Database(path)
+    with db as conn:
+        slots = conn.execute("SELECT s.table_nr, r.name FROM table_slots s \
+                              JOIN reservation r ON r.id = s.reservation_id ORDER BY s.table_nr").fetchall()
+    db.close()
+    tables = [table_nr for table_nr, _ in slots]
+    assert len(tables) == len(set(tables))
+    assert {name for _, name in slots} == {name for name, ok in booked.items() if ok}
+    assert len(slots) == sum(2 if name != "D" else 3 for name, ok in booked.items() if ok)
+
+
+def test_joined_booking_is_all_or_nothing(db):
+    assert db.book(Reservation(db, 2, "A", f"{day()}_19", 3))
+    late = Reservation(db, 8, "B", f"{day()}_19", 2)
+    assert db.book(late, (3,)) is False
+    assert slot_rows(db, late.id) == []
+    assert db.get_reservation_by_id(late.id) is None
+
+
+@pytest.mark.parametrize("hour", ["9", "23", "x", ""])
+def test_book_rejects_hours_outside_opening(db, hour):
+    reservation = Reservation(db, 2, "A", f"{day()}_{hour}", 1)
+    assert db.book(reservation) is None
+    assert slot_rows(db, reservation.id) == []
+    assert db.get_reservation_by_id(reservation.id) is None
+
+
+def test_rollback_forgets_cached_reads(db):
+    with pytest.raises(RuntimeError):
+        with db.transaction():
+            db.remove_table(2)
+            assert 2 not in [table_nr for table_nr, _ in db.get_tables()]
+            raise RuntimeError
+    assert db.get_tables(2) == [(2, 4)]
+    assert 2 in [table_nr for table_nr, _ in db.get_tables()]
+
+
+def test_cache_skips_values_read_before_an_invalidation(db):
+    def load():
+        with db as conn:
+            rows = conn.execute("SELECT * FROM tables WHERE table_nr=2").fetchall()
+        # Another thread resizes the table after this read but before it is cached
+        writer = threading.Thread(target=db.update_table, args=(Table(db, 8, 2),))
+        writer.start()
+        writer.join()
+        return rows
+
+    assert db.cached(("tables", "2"), load) == [(2, 4)]
+    assert db.table_cache.get(("tables", "2")) is None
+    assert db.get_tables(2) == [(2, 8)]
+
+
+def test_move_keeps_other_parties_slots(db):
+    a = Reservation(db, 2, "A", f"{day()}_19", 1)
+    b = Reservation(db, 2, "B", f"{day()}_19", 2)
+    assert db.book(a) and db.book(b)
+    assert db.update_reservation((a.id, "A", 2, f"{day()}_19", 2)) is False
+    assert db.get_reservation_by_id(a.id)[4] == 1
+    # A row that points at another party's table, like update_reservation() used to leave behind
+    with db.transaction() as conn:
+        conn.execute("UPDATE reservation SET table_nr=2 WHERE id=?", (a.id,))
+    assert db.move_reservation(a.id, f"{day()}_20")
+    assert slot_rows(db, a.id) == [(1, day(), 20)]
+    assert slot_rows(db, b.id) == [(2, day(), 19)]
+
+    # Without any slot of its own the reservation gets a new one, B's slot stays B's
+    with db.transaction() as conn:
+        conn.execute("DELETE FROM table_slots WHERE reservation_id=?", (a.id,))
+        conn.execute("UPDATE reservation SET date=?, table_nr=2 WHERE id=?", (f"{day()}_19", a.id))
+    assert db.move_reservation(a.id, f"{day()}_21")
+    assert slot_rows(db, a.id) == [(2, day(), 21)]
+    assert slot_rows(db, b.id) == [(2, day(), 19)]
+
+
+@pytest.mark.parametrize("date", [None, f"{day()}_20"])
+def test_move_onto_own_joined_table(db, date):
+    party = Reservation(db, 8, "A", f"{day()}_19", 1)
+    assert db.book(party, (2, 3))
+    assert db.move_reservation(party.id, date, 2) is True
+    assert slot_rows(db, party.id) == [(2, day(), 20 if date else 19)]
+    assert db.get_reservation_by_id(party.id)[3:] == ((date or f"{day()}_19"), 2)
+
+
+def test_tracer_counts_each_statement_once(path):
+    db = Database(path, trace=True)
+    db.tracer.reset()
+    assert db.book(Reservation(db, 2, "A", f"{day()}_19", 1))
+    with db as conn:
+        conn.executemany("UPDATE tables SET capacity=? WHERE table_nr=?", [(4, 1), (6, 2), (6, 3)])
+    calls = {statement["sql"]: statement["calls"] for statement in db.tracer.top(100)}
+    db.close()
+
+    # The slot_summary triggers make SQLite report the INSERT again, those echoes are not calls
+    assert calls["INSERT INTO table_slots (table_nr, day, hour, reservation_id) VALUES (?, ...)"] == 1
+    assert calls["UPDATE tables SET capacity=? WHERE table_nr=?"] == 3
+    assert calls["BEGIN IMMEDIATE"] == calls["COMMIT"]
+
+
+def test_nested_transaction_rolls_back_alone(db):
+    kept = Reservation(db, 2, "Kept", f"{day()}_19", 1)
+    lost = Reservation(db, 2, "Lost", f"{day()}_19", 2)
+    with db.transaction():
+        assert db.book(kept)
+        with pytest.raises(RuntimeError):
+            with db.transaction():
+                assert db.book(lost)
+                raise RuntimeError
+    assert slot_rows(db, kept.id) == [(1, day(), 19)]
+    assert slot_rows(db, lost.id) == []
+    assert db.get_reservation_by_id(lost.id) is None
+
+
+def test_failing_write_leaves_its_batch_alone(db):
+    def fail():
+        db.book(Reservation(db, 2, "Lost", f"{day()}_20", 3))
+        raise RuntimeError
+
+    parties = [Reservation(db, 2, name, f"{day()}_19", table_nr) for name, table_nr in (("A", 1), ("B", 2))]
+    with WriteBatcher(db, max_delay=0.05) as batcher:
+        futures = [batcher.book(parties[0]), batcher.submit(fail), batcher.book(parties[1])]
+        assert futures[0].result() is True and futures[2].result() is True
+        with pytest.raises(RuntimeError):
+            futures[1].result()
+    with db as conn:
+        assert conn.execute("SELECT name FROM reservation ORDER BY name").fetchall() == [("A",), ("B",)]
+        assert conn.execute("SELECT count(*) FROM table_slots").fetchone() == (2,)
+
+
+def test_slot_summary_matches_recount(db):
+    def summary():
+        with db as conn:
+            return conn.execute("SELECT day, hour, capacity, booked FROM slot_summary WHERE booked > 0 \
+                                 ORDER BY day, hour, capacity").fetchall()
+
+    def recount():
+        with db as conn:
+            return conn.execute("SELECT s.day, s.hour, t.capacity, count(*) FROM table_slots s \
+                                 JOIN tables t ON t.table_nr = s.table_nr GROUP BY s.day, s.hour, t.capacity \
+                                 ORDER BY s.day, s.hour, t.capacity").fetchall()
+
+    parties = [Reservation(db, 2, "A", f"{day()}_19", 1), Reservation(db, 4, "B", f"{day()}_19", 2),
+               Reservation(db, 3, "C", f"{day()}_20", 3), Reservation(db, 8, "D", f"{day(2)}_18", 3)]
+    for reservation in parties[:3]:
+        assert db.book(reservation)
+    assert db.book(parties[3], (4,))
+    assert summary() == recount()
+
+    steps = [
+        lambda: db.move_reservation(parties[0].id, f"{day()}_21"),
+        lambda: db.move_reservation(parties[1].id, None, 4),
+        lambda: db.move_reservation(parties[3].id, f"{day(2)}_22"),
+        lambda: db.update_reservation((parties[2].id, "C", 3, f"{day(3)}_17", 2)),
+        lambda: optimize_day(db, day()),
+        lambda: db.update_table(Table(db, 8, 2)),
+        lambda: db.remove_reservation(parties[0].id),
+        lambda: db.remove_table(4),
+    ]
+    for step in steps:
+        assert step() is not False
+        assert summary() == recount()
+    assert summary() != []
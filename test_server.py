@@ -0,0 +1,58 @@
+import socket
+import pytest
+from database import Database
+from server import BookingClient, BookingServer, LocalClient, open_booking
+from timetable import calendar_days
+
+
+@pytest.fixture
+def path(tmp_path, monkeypatch):
+    # A key of its own, so the tests never create the key file in the home directory
+    monkeypatch.setenv("BOOKING_SERVER_KEY", "42" * 32)
+    db = Database(str(tmp_path / "db.db"))
+    db.new_tables_bulk([2, 4, 4, 6])
+    db.close()
+    return str(tmp_path / "db.db")
+
+
+def day():
+    return calendar_days(count=2)[1]
+
+
+def book_and_read(client):
+    assert client.tables_left(day(), 4)[19] == 3
+    reservation_id, tables = client.book_party(4, "Anna", day(), 19)
+    assert tables == (2,)
+    assert client.get_reservation_by_id(reservation_id) == (reservation_id, "Anna", 4, f"{day()}_19", 2)
+    assert client.tables_left(day(), 4)[19] == 2
+    assert client.get_table_times(2, day())[19] is True
+    assert client.free_tables(4, day(), 19) == [3, 4]
+    assert client.reservations_page(0, 10) == [(reservation_id, "Anna", 4, f"{day()}_19", 2)]
+    # Tables 3 and 4 are still free and stand next to each other, together they seat 10 but not 11
+    assert client.available_times(10, day())[19] is False
+    assert client.available_times(11, day())[19] is True
+    assert client.book_party(2, "Bo", "Monday", 19) is None
+
+
+def test_server_books_and_reads(path):
+    server = BookingServer(path, ("127.0.0.1", 0), workers=1).start()
+    try:
+        with open_booking(path, server.address) as client:
+            assert isinstance(client, BookingClient)
+            book_and_read(client)
+    finally:
+        server.close()
+
+
+def test_open_booking_without_server(path):
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        address = probe.getsockname()
+    with open_booking(path, address) as client:
+        assert isinstance(client, LocalClient)
+        book_and_read(client)
+
+
+def test_server_only_listens_on_loopback(path):
+    with pytest.raises(ValueError):
+        BookingServer(path, ("0.0.0.0", 0), workers=1)
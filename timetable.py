@@ -1,18 +1,73 @@
-from json import dumps as json_dumps
+import datetime
 
 
-def gen_timetable() -> dict:
-    weekdays = {"Monday": None, "Tuesday": None, "Wednesday": None,
-                "Thursday": None, "Friday": None, "Saturday": None, "Sunday": None}
-    time_slots = {}
-    for i in range(17, 23):
-        time_slots[i] = False
+WEEKDAYS = ("Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday")
+HOURS = tuple(range(17, 23))
+# Every slot of a seven day window packed into one int, one bit per (day, hour)
+WEEK_MASK = (1 << (len(WEEKDAYS) * len(HOURS))) - 1
+# How many days ahead a table can be booked, Database(horizon=...) can change it
+HORIZON_DAYS = 90
 
-    for value in weekdays:
-        weekdays[value] = time_slots
+
+def today() -> str:
+    return datetime.date.today().isoformat()
+
+
+def calendar_days(start=None, count=len(WEEKDAYS)) -> tuple:
+    # `count` dates in ISO format ("2024-02-05"), from `start` (a date or ISO string) or today. These are the keys
+    # of every timetable, and because ISO dates sort like strings, "day < ?" in SQL means "before that day".
+    if start is None:
+        start = datetime.date.today()
+    elif isinstance(start, str):
+        start = datetime.date.fromisoformat(start)
+    return tuple((start + datetime.timedelta(days=i)).isoformat() for i in range(count))
+
+
+def week() -> tuple:
+    # Today and the six days after it
+    return calendar_days()
+
+
+def weekday(day: str) -> str:
+    # "2024-02-05" -> "Monday"
+    return WEEKDAYS[datetime.date.fromisoformat(day).weekday()]
+
+
+def next_date(day_name: str, start=None) -> str:
+    # The first date on or after `start` (default today) that falls on the weekday `day_name`
+    start = datetime.date.fromisoformat(start) if start else datetime.date.today()
+    return (start + datetime.timedelta(days=(WEEKDAYS.index(day_name) - start.weekday()) % 7)).isoformat()
+
+
+def gen_timetable(days=None) -> dict:
+    weekdays = {}
+    for day in days or week():
+        # Every day gets its own dict so that booking one day does not book them all
+        weekdays[day] = {hour: False for hour in HOURS}
 
     return weekdays
 
 
-def gen_timetable_string() -> str:
-    return json_dumps(gen_timetable())
+def gen_timetable_string(days=None) -> str:
+    # json is imported here, it is the slowest part of importing this module and rarely needed
+    from json import dumps as json_dumps
+    return json_dumps(gen_timetable(days))
+
+
+def slot_index(day: str, hour, days=None) -> int:
+    # Position of a (day, hour) slot in a packed window of days (default this week), the first day's 17 is 0
+    return (days or week()).index(day) * len(HOURS) + HOURS.index(int(hour))
+
+
+def slot_from_index(index: int, days=None) -> tuple:
+    return (days or week())[index // len(HOURS)], HOURS[index % len(HOURS)]
+
+
+def window_mask(days) -> int:
+    # Every slot of a window of days packed into one int
+    return (1 << (len(days) * len(HOURS))) - 1
+
+
+def day_mask(day: str, days=None) -> int:
+    # All the bits of one day in a packed window of days
+    return ((1 << len(HOURS)) - 1) << slot_index(day, HOURS[0], days)
@@ -1,8 +1,6 @@
 # Import customtkinter module
 import customtkinter as ctk
 import tkinter as tk
-import guest
-from database import Database
 
 
 # Sets the appearance mode of the application
@@ -13,37 +11,90 @@ ctk.set_appearance_mode("dark")
 # Supported themes: green, dark-blue, blue
 ctk.set_default_color_theme("dark-blue")
 
-list_of_names = list(guest.gen_dates())
+# The booking dates, filled in by get_dates() when the booking window first opens
+dates = None
+
+# How often the window picks up loaded times, and how often it asks again for the times it shows (milliseconds)
+POLL_MS = 50
+REFRESH_MS = 15000
 
 
 # window size
 appWidth, appHeight = 900, 700
 
 
+def get_dates() -> dict:
+    # guest is imported here, so the main window is up before any of the booking code is loaded
+    global dates
+    if dates is None:
+        import guest
+        dates = guest.gen_dates()
+    return dates
+
+
 class ToplevelWindow(ctk.CTkToplevel):
-    def __init__(self, *args, **kwargs):
+    def __init__(self, availability, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.geometry("900x500")
         self.grid_rowconfigure((0, 1, 2), weight=1)
         self.grid_columnconfigure((0, 1, 2, 3, 4), weight=1)
         self.title("Bokpapper")
 
+        # The database is only read on the loader's thread, the window just polls for results
+        self.availability = availability
+        self.availability.prefetch(get_dates().values())
+        self.poll_job = self.after(POLL_MS, self.poll)
+        self.refresh_job = self.after(REFRESH_MS, self.refresh)
+
     def get_info(self):
+        list_of_names = list(get_dates())
 
         self.name_input = ctk.CTkEntry(self)
         self.name_input.insert(0, "Enter Name")
         self.name_input.grid(row=1, column=0, sticky="n")
 
         self.guest_amount = ctk.CTkOptionMenu(
-            self, values=["1", "2", "3", "4", "5", "6", "7", "8"])
+            self, values=["1", "2", "3", "4", "5", "6", "7", "8"], command=self.show_available_times)
         self.guest_amount.grid(row=1, column=2, sticky="n")
 
         self.date_input = ctk.CTkOptionMenu(self, values=[list_of_names[0], list_of_names[1], list_of_names[2],
-                                            list_of_names[3], list_of_names[4], list_of_names[5], list_of_names[6]], command=guest.select_time)
+                                            list_of_names[3], list_of_names[4], list_of_names[5], list_of_names[6]], command=self.show_available_times)
         self.date_input.grid(row=1, column=4, sticky="n")
 
-    def available_times(self):
-        pass
+        self.times_label = ctk.CTkLabel(self, text="")
+        self.times_label.grid(row=2, column=0, columnspan=5, sticky="n")
+        self.show_available_times()
+
+    def selection(self):
+        # The (date, party size) picked in the menus
+        return get_dates()[self.date_input.get()], int(self.guest_amount.get())
+
+    def show_available_times(self, *_):
+        # Called by both menus, shows cached times at once and otherwise waits for the loader
+        day, amount = self.selection()
+        if not self.availability.get(day, amount, self.available_times):
+            self.times_label.configure(text="Loading free times...")
+
+    def available_times(self, day, amount, times):
+        # Called through poll() on the Tk thread, results for an older selection are ignored
+        if (day, amount) != self.selection():
+            return
+        self.times_label.configure(text="\n".join(
+            f"{hour}.00 (Occupied)" if occupied else f"{hour}.00" for hour, occupied in times.items()))
+
+    def poll(self):
+        self.availability.poll()
+        self.poll_job = self.after(POLL_MS, self.poll)
+
+    def refresh(self):
+        # Stale times are shown again once the loader has read them anew, bookings from other terminals included
+        self.show_available_times()
+        self.refresh_job = self.after(REFRESH_MS, self.refresh)
+
+    def destroy(self):
+        self.after_cancel(self.poll_job)
+        self.after_cancel(self.refresh_job)
+        super().destroy()
 
 # Create App class
 
@@ -58,10 +109,25 @@ class App(ctk.CTk):
         self.geometry(f"{appWidth}x{appHeight}")
 
         self.toplevel_window = None
+        # Started with the first booking window, see open_database()
+        self.availability = None
+
+    def open_database(self):
+        # The loader connects to the booking server, or opens the database, on its own thread, so the window
+        # never waits for it
+        if self.availability is None:
+            from availability import AvailabilityLoader
+            from server import open_booking
+            self.availability = AvailabilityLoader(factory=open_booking)
+        return self.availability
+
+    def close_database(self):
+        if self.availability is not None:
+            self.availability.close()
 
     def booking_page(self):
-        if self.toplevel_window is None or not self.toplevel_window_winfo_exists():
-            self.toplevel_window = ToplevelWindow(self)
+        if self.toplevel_window is None or not self.toplevel_window.winfo_exists():
+            self.toplevel_window = ToplevelWindow(self.open_database(), self)
             self.toplevel_window.get_info()
         else:
             self.toplevel_window.focus()
@@ -83,10 +149,10 @@ class App(ctk.CTk):
 
 def main():
     app = App()
-    db = Database()
 
     app.main_page()
     app.mainloop()
+    app.close_database()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,248 @@
+import re
+import sqlite3
+import threading
+import time
+from collections import deque
+
+
+# Literals and lists of placeholders are replaced so that every run of a statement has the same text
+NORMALIZE = (
+    (re.compile(r"'(?:[^']|'')*'"), "?"),
+    (re.compile(r"(?<![\w.])-?\d+(?:\.\d+)?\b"), "?"),
+    (re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)"), "(?, ...)"),
+    (re.compile(r"\s+"), " "),
+)
+
+
+def normalize(sql) -> str:
+    for pattern, replacement in NORMALIZE:
+        sql = pattern.sub(replacement, sql)
+    return sql.strip()
+
+
+def full_scans(plan) -> list:
+    # The steps of an EXPLAIN QUERY PLAN that read a whole table instead of seeking an index
+    return [detail for detail in plan
+            if detail.startswith("SCAN") and "USING INDEX" not in detail and "USING COVERING INDEX" not in detail
+            and "CONSTANT ROW" not in detail]
+
+
+def explain(conn, sql, params=()):
+    """
+    Runs EXPLAIN QUERY PLAN for a statement and reports the full table scans in it.
+
+    Parameters:
+    - conn (sqlite3.Connection): The connection to ask, for example from `with db as conn`.
+    - sql (str): The statement to explain, with ? placeholders.
+    - params (tuple, optional): Values for the placeholders. The plan rarely depends on them, so NULLs are used
+      for missing ones.
+
+    Returns:
+    - dict: "plan" with the detail text of every step and "full_scans" with the steps that scan a whole table.
+
+    Example:
+    ```
+    with db as conn:
+        print(explain(conn, "SELECT * FROM reservation WHERE name=?", ("Anna",)))
+    # {'plan': ['SCAN reservation'], 'full_scans': ['SCAN reservation']}
+    ```
+    """
+    params = tuple(params) + (None,) * (sql.count("?") - len(params))
+    plan = [row[-1] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params)]
+    return {"plan": plan, "full_scans": full_scans(plan)}
+
+
+class StatementStats:
+    __slots__ = ("sql", "calls", "timed", "seconds", "max_seconds")
+
+    def __init__(self, sql) -> None:
+        self.sql = sql
+        self.calls = 0
+        self.timed = 0
+        self.seconds = 0.0
+        self.max_seconds = 0.0
+
+    def to_dict(self) -> dict:
+        return {"sql": self.sql, "calls": self.calls, "total_ms": self.seconds * 1000,
+                "mean_ms": self.seconds / self.timed * 1000 if self.timed else 0.0, "max_ms": self.max_seconds * 1000}
+
+
+class Tracer:
+    """
+    Collects every SQL statement a Database runs, grouped by normalized text, with timings and a slow log.
+
+    Description:
+    Database(trace=True) gives every pooled connection to attach(). Two hooks are installed on it:
+    - the connection is a TracingConnection whose cursors count and time execute(), executemany() (one call per
+      row) and the fetch calls of the statement, which gives the call counts and the latency,
+    - sqlite3's set_trace_callback() adds what never passes a cursor: commit(), rollback() and the BEGIN that
+      sqlite3 issues on its own. While a cursor runs, the callback ignores everything else, because SQLite
+      reports the outer statement again for every trigger it fires, so a booking's INSERT INTO table_slots would
+      count three times with the slot_summary triggers.
+    Statements are grouped after normalize() has replaced values by "?", so "WHERE id=3" and "WHERE id=4" count
+    as one statement. Every timed run slower than `slow_ms` goes into the slow log with its parameters.
+
+    Example:
+    ```
+    db = Database(trace=True, slow_ms=5)
+    ...
+    for statement in db.tracer.top(5):
+        print(statement["calls"], statement["total_ms"], statement["sql"])
+    print(db.tracer.check_plans(db))
+    ```
+    """
+
+    def __init__(self, slow_ms=10.0, slow_log_size=200) -> None:
+        self.slow_ms = slow_ms
+        self.statements = {}
+        self.slow = deque(maxlen=slow_log_size)
+        self._lock = threading.Lock()
+
+    def attach(self, conn):
+        conn.tracer = self
+        conn.set_trace_callback(lambda sql: self.on_traced(conn, sql))
+
+    def stats(self, sql) -> StatementStats:
+        key = normalize(sql)
+        stats = self.statements.get(key)
+        if stats is None:
+            stats = self.statements[key] = StatementStats(key)
+        return stats
+
+    def on_traced(self, conn, sql):
+        # Inside a cursor's run only the BEGIN that sqlite3 adds in front of it is new, the rest are trigger echoes
+        if conn.running is None or sql.startswith("BEGIN") and not conn.running.lstrip().upper().startswith("BEGIN"):
+            with self._lock:
+                self.stats(sql).calls += 1
+
+    def on_timed(self, sql, params, seconds, total, new_run, slow_entry, calls=0):
+        # One piece of a run: its execute() (new_run, with its `calls`) or a later fetch. total is the run's time
+        # so far. Returns the run's slow log entry once it has one, so later fetches can update its time.
+        with self._lock:
+            stats = self.stats(sql)
+            stats.calls += calls
+            stats.timed += new_run
+            stats.seconds += seconds
+            stats.max_seconds = max(stats.max_seconds, total)
+            if slow_entry is not None:
+                slow_entry["ms"] = total * 1000
+            elif total * 1000 >= self.slow_ms:
+                slow_entry = {"time": time.time(), "ms": total * 1000, "sql": sql, "params": params}
+                self.slow.append(slow_entry)
+            return slow_entry
+
+    def top(self, count=10, by="total_ms") -> list:
+        # The `count` statements with the highest `by` (total_ms, calls, mean_ms or max_ms)
+        with self._lock:
+            statements = [stats.to_dict() for stats in self.statements.values()]
+        return sorted(statements, key=lambda statement: statement[by], reverse=True)[:count]
+
+    def slow_log(self) -> list:
+        with self._lock:
+            return list(self.slow)
+
+    def reset(self):
+        with self._lock:
+            self.statements = {}
+            self.slow.clear()
+
+    def check_plans(self, db) -> dict:
+        """
+    Runs explain() for every recorded SELECT, UPDATE and DELETE and returns the ones with a full table scan.
+
+    Parameters:
+    - db (Database): The database the statements ran against.
+
+    Returns:
+    - dict: The normalized statement text mapped to its full scan steps, only for statements that have one.
+    """
+        with self._lock:
+            keys = [key for key in self.statements if key.split(" ", 1)[0].upper() in ("SELECT", "UPDATE", "DELETE")]
+
+        found = {}
+        with db as conn:
+            for key in keys:
+                try:
+                    scans = explain(conn, key.replace("(?, ...)", "(?)"))["full_scans"]
+                except sqlite3.Error:
+                    continue
+                if scans:
+                    found[key] = scans
+        return found
+
+
+class TracingCursor(sqlite3.Cursor):
+    # Counts and times execute() together with every fetch of its rows and reports them to the connection's
+    # tracer. Rows read by looping over the cursor itself are not timed.
+    def start(self, sql, params):
+        self.sql, self.params, self.seconds, self.slow_entry = sql, params, 0.0, None
+        self.connection.running = sql
+        return time.perf_counter()
+
+    def execute(self, sql, params=()):
+        started = self.start(sql, params)
+        try:
+            return super().execute(sql, params)
+        finally:
+            self.connection.running = None
+            self.report(started, True, 1)
+
+    def executemany(self, sql, rows):
+        started = self.start(sql, "executemany")
+        calls = [0]
+
+        def counted():
+            for row in rows:
+                calls[0] += 1
+                yield row
+
+        try:
+            return super().executemany(sql, counted())
+        finally:
+            self.connection.running = None
+            self.report(started, True, calls[0])
+
+    def fetchone(self):
+        started = time.perf_counter()
+        try:
+            return super().fetchone()
+        finally:
+            self.report(started)
+
+    def fetchmany(self, size=None):
+        started = time.perf_counter()
+        try:
+            return super().fetchmany(size) if size is not None else super().fetchmany()
+        finally:
+            self.report(started)
+
+    def fetchall(self):
+        started = time.perf_counter()
+        try:
+            return super().fetchall()
+        finally:
+            self.report(started)
+
+    def report(self, started, new_run=False, calls=0):
+        # Statements run before the tracer is attached (the pool's PRAGMAs) are not reported
+        if getattr(self, "sql", None) is None or self.connection.tracer is None:
+            return
+        seconds = time.perf_counter() - started
+        self.seconds += seconds
+        self.slow_entry = self.connection.tracer.on_timed(self.sql, self.params, seconds, self.seconds, new_run,
+                                                          self.slow_entry, calls)
+
+
+class TracingConnection(sqlite3.Connection):
+    tracer = None
+    # The statement one of its cursors is running, see Tracer.on_traced()
+    running = None
+
+    def cursor(self, factory=TracingCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, params=()):
+        return self.cursor().execute(sql, params)
+
+    def executemany(self, sql, rows):
+        return self.cursor().executemany(sql, rows)